@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Request outcomes reported back to the limiter
+OUTCOME_SUCCESS = 'success'
+OUTCOME_OVERLOAD = 'overload'  # 429, 5xx and timeouts - the upstream is struggling
+OUTCOME_ERROR = 'error'        # Client-side or unrelated failures that say nothing about load
+
+
+class AdaptiveConcurrencyLimiter:
+    """Additive-increase / multiplicative-decrease limiter for in-flight upstream requests"""
+
+    def __init__(self, initial_limit: int = 10, min_limit: int = 1, max_limit: int = 100,
+                 latency_target: float = 1.0, backoff_factor: float = 0.5, name: str = 'limiter'):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.latency_target = latency_target
+        self.backoff_factor = backoff_factor
+
+        self._limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+        # Observed latency and outcome window
+        self._latency_ewma: Optional[float] = None
+        self._latencies = deque(maxlen=200)
+        self._outcomes = deque(maxlen=200)
+        self._decreases = 0
+
+    @property
+    def limit(self) -> int:
+        """Current concurrency window"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Created lazily so the limiter binds to the loop that actually uses it
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> float:
+        """Wait for a free slot in the window and return the request start time"""
+        condition = self._get_condition()
+        while True:
+            # Honour upstream Retry-After before sending anything else
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+
+            async with condition:
+                while self._in_flight >= self.limit:
+                    await condition.wait()
+                if self._paused_until > time.monotonic():
+                    continue
+                self._in_flight += 1
+                return time.monotonic()
+
+    async def release(self, started_at: float, outcome: str, retry_after: Optional[float] = None):
+        """Return a slot and adjust the window based on the request outcome"""
+        now = time.monotonic()
+        latency = now - started_at
+
+        self._record(latency, outcome)
+
+        if outcome == OUTCOME_OVERLOAD:
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            self._decrease(now)
+        elif outcome == OUTCOME_SUCCESS:
+            if latency > self.latency_target:
+                self._decrease(now)
+            else:
+                # Additive increase: roughly +1 per full window of healthy responses
+                self._limit = min(self.max_limit, self._limit + 1.0 / max(self._limit, 1.0))
+
+        condition = self._get_condition()
+        async with condition:
+            self._in_flight -= 1
+            condition.notify_all()
+
+    def _record(self, latency: float, outcome: str):
+        """Track latency and outcomes for the stats snapshot"""
+        self._latencies.append(latency)
+        self._outcomes.append(outcome)
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * latency
+
+    def _decrease(self, now: float):
+        """Multiplicative decrease, at most once per observed round trip"""
+        if now - self._last_decrease < (self._latency_ewma or 0.0):
+            return
+
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.backoff_factor)
+        self._last_decrease = now
+        self._decreases += 1
+
+        if self.limit != previous:
+            logger.info(f"{self.name}: reducing concurrency window {previous} -> {self.limit}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the current window and observed latency"""
+        latencies = sorted(self._latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+        errors = sum(1 for outcome in self._outcomes if outcome != OUTCOME_SUCCESS)
+
+        return {
+            'limit': self.limit,
+            'in_flight': self._in_flight,
+            'latency_ewma_ms': round(self._latency_ewma * 1000, 1) if self._latency_ewma is not None else None,
+            'latency_p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+            'error_rate': round(errors / len(self._outcomes), 3) if self._outcomes else 0.0,
+            'decreases': self._decreases,
+            'paused': self._paused_until > time.monotonic()
+        }
@@ -0,0 +1,188 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_PERIODS = ('hour', 'day')
+MIGRATION_BATCH_SIZE = 1000
+
+
+class BalanceHistoryStore:
+    """Time-series balance history with retention and hourly/daily rollups"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, collection_name: str = 'balance_history',
+                 rollup_collection_name: str = 'balance_history_rollups',
+                 retention_days: int = 90, rollup_retention_days: int = 730, legacy_ttl: bool = False,
+                 migrate_legacy: bool = False):
+        self.db = db
+        self.collection_name = collection_name
+        self.retention_seconds = int(retention_days * 86400)
+        self.rollup_retention_seconds = int(rollup_retention_days * 86400)
+        # Expire old documents in a pre-time-series collection too (deletes existing history)
+        self.legacy_ttl = legacy_ttl
+        # Move a pre-time-series collection aside and copy it into a new time-series one
+        self.migrate_legacy = migrate_legacy
+        self.legacy_collection_name = f"{collection_name}_legacy"
+
+        self.collection: AsyncIOMotorCollection = db[collection_name]
+        self.rollups_collection: AsyncIOMotorCollection = db[rollup_collection_name]
+
+    @classmethod
+    def from_env(cls, db: AsyncIOMotorDatabase) -> 'BalanceHistoryStore':
+        return cls(
+            db,
+            collection_name=os.getenv('BALANCE_HISTORY_COLLECTION', 'balance_history'),
+            rollup_collection_name=os.getenv('BALANCE_ROLLUP_COLLECTION', 'balance_history_rollups'),
+            retention_days=int(os.getenv('BALANCE_HISTORY_RETENTION_DAYS', '90')),
+            rollup_retention_days=int(os.getenv('BALANCE_ROLLUP_RETENTION_DAYS', '730')),
+            legacy_ttl=os.getenv('BALANCE_HISTORY_LEGACY_TTL', 'false').lower() == 'true',
+            migrate_legacy=os.getenv('BALANCE_HISTORY_MIGRATE_LEGACY', 'false').lower() == 'true'
+        )
+
+    async def ensure_collections(self):
+        """Create the time-series collection and rollup indexes, or bring retention up to date.
+
+        With ``migrate_legacy``, a plain collection is first renamed aside and its
+        history copied into a freshly created time-series collection.
+        """
+        existing = await self._collection_info(self.collection_name)
+
+        if existing and existing[0].get('type') != 'timeseries' and self.migrate_legacy:
+            await self.collection.rename(self.legacy_collection_name)
+            logger.info(f"Renamed legacy '{self.collection_name}' to '{self.legacy_collection_name}' for migration")
+            existing = []
+
+        if not existing:
+            await self.db.create_collection(
+                self.collection_name,
+                timeseries={'timeField': 'timestamp', 'metaField': 'walletAddress', 'granularity': 'minutes'},
+                expireAfterSeconds=self.retention_seconds
+            )
+            logger.info(f"Created time-series collection '{self.collection_name}' "
+                        f"(retention {self.retention_seconds // 86400} days)")
+        elif existing[0].get('type') == 'timeseries':
+            if existing[0].get('options', {}).get('expireAfterSeconds') != self.retention_seconds:
+                await self.db.command('collMod', self.collection_name, expireAfterSeconds=self.retention_seconds)
+                logger.info(f"Updated '{self.collection_name}' retention to {self.retention_seconds // 86400} days")
+        else:
+            # A plain collection from before the time-series layout. Its history is kept as-is
+            # unless retention is explicitly opted into, since a TTL index deletes old documents.
+            await self.collection.create_index([('walletAddress', ASCENDING), ('timestamp', ASCENDING)])
+            if self.legacy_ttl:
+                await self.collection.create_index('timestamp', expireAfterSeconds=self.retention_seconds)
+                logger.info(f"Applied {self.retention_seconds // 86400} day TTL to legacy '{self.collection_name}'")
+            else:
+                logger.warning(f"'{self.collection_name}' is not a time-series collection and has no retention; "
+                               f"set BALANCE_HISTORY_MIGRATE_LEGACY=true to copy it into a time-series collection, "
+                               f"or BALANCE_HISTORY_LEGACY_TTL=true to expire old history in place")
+
+        if self.migrate_legacy:
+            await self._copy_legacy_history()
+
+        await self.rollups_collection.create_index(
+            [('walletAddress', ASCENDING), ('period', ASCENDING), ('bucketStart', ASCENDING)],
+            unique=True
+        )
+        await self.rollups_collection.create_index('bucketStart', expireAfterSeconds=self.rollup_retention_seconds)
+
+    async def _collection_info(self, name: str) -> List[Dict[str, Any]]:
+        cursor = await self.db.list_collections(filter={'name': name})
+        return await cursor.to_list(None)
+
+    async def _copy_legacy_history(self):
+        """Copy the renamed legacy collection into the time-series collection.
+
+        Documents older than the retention period are skipped, since they would
+        expire straight away. Copying resumes from the newest timestamp already
+        in the time-series collection, so an interrupted migration continues on
+        the next start. The legacy collection is kept; drop it once verified.
+        """
+        if not await self._collection_info(self.legacy_collection_name):
+            return
+
+        legacy = self.db[self.legacy_collection_name]
+        since = datetime.utcnow() - timedelta(seconds=self.retention_seconds)
+        query: Dict[str, Any] = {'timestamp': {'$gte': since}}
+        latest = await self.collection.find_one({}, sort=[('timestamp', DESCENDING)])
+        if latest and latest['timestamp'] >= since:
+            # Documents sharing the newest timestamp may be only partly copied
+            copied_ids = await self.collection.distinct('_id', {'timestamp': latest['timestamp']})
+            query = {'timestamp': {'$gte': latest['timestamp']}, '_id': {'$nin': copied_ids}}
+
+        copied = 0
+        batch: List[Dict[str, Any]] = []
+        async for document in legacy.find(query).sort('timestamp', ASCENDING):
+            batch.append(document)
+            if len(batch) >= MIGRATION_BATCH_SIZE:
+                await self.collection.insert_many(batch, ordered=False)
+                copied += len(batch)
+                batch = []
+        if batch:
+            await self.collection.insert_many(batch, ordered=False)
+            copied += len(batch)
+
+        logger.info(f"Copied {copied} documents from '{self.legacy_collection_name}' into '{self.collection_name}'; "
+                    f"drop '{self.legacy_collection_name}' and unset BALANCE_HISTORY_MIGRATE_LEGACY once verified")
+
+    async def run_rollups(self, now: Optional[datetime] = None):
+        """Recompute the current and previous hourly/daily buckets from raw history.
+
+        Buckets are rebuilt from scratch and merged by (walletAddress, period,
+        bucketStart), so the job is idempotent and late writes are picked up.
+        """
+        now = now or datetime.utcnow()
+
+        for period in ROLLUP_PERIODS:
+            if period == 'hour':
+                since = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+            else:
+                since = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+
+            await self.collection.aggregate([
+                {'$match': {'timestamp': {'$gte': since}}},
+                {'$sort': {'timestamp': 1}},
+                {'$group': {
+                    '_id': {
+                        'walletAddress': '$walletAddress',
+                        'bucketStart': {'$dateTrunc': {'date': '$timestamp', 'unit': period}}
+                    },
+                    # The balance before the first change in a bucket is part of its range too
+                    'min': {'$min': {'$min': ['$previousBalance', '$currentBalance']}},
+                    'max': {'$max': {'$max': ['$previousBalance', '$currentBalance']}},
+                    'last': {'$last': '$currentBalance'},
+                    'changes': {'$sum': 1}
+                }},
+                {'$project': {
+                    '_id': 0,
+                    'walletAddress': '$_id.walletAddress',
+                    'period': {'$literal': period},
+                    'bucketStart': '$_id.bucketStart',
+                    'min': 1,
+                    'max': 1,
+                    'last': 1,
+                    'changes': 1,
+                    'updatedAt': '$$NOW'
+                }},
+                {'$merge': {
+                    'into': self.rollups_collection.name,
+                    'on': ['walletAddress', 'period', 'bucketStart'],
+                    'whenMatched': 'replace',
+                    'whenNotMatched': 'insert'
+                }}
+            ]).to_list(None)
+
+        logger.info("Balance history rollups refreshed")
+
+    async def get_rollups(self, wallet_address: str, period: str = 'day',
+                          since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Read compact rollups for a wallet instead of scanning raw change events"""
+        query: Dict[str, Any] = {'walletAddress': wallet_address, 'period': period}
+        if since:
+            query['bucketStart'] = {'$gte': since}
+
+        return await self.rollups_collection.find(query, {'_id': 0}).sort('bucketStart', ASCENDING).to_list(None)
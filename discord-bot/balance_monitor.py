@@ -3,157 +3,402 @@ import logging
 import aiohttp
 import os
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-from pymongo import MongoClient
-from pymongo.collection import Collection
-from pymongo.database import Database
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Iterable, Union, Set, FrozenSet
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
 import threading
 import time
 import json
 
+from adaptive_limiter import AdaptiveConcurrencyLimiter, OUTCOME_SUCCESS, OUTCOME_OVERLOAD, OUTCOME_ERROR
+from lcd_pool import LCDEndpointPool, LCDResponse
+from rpc_balance import TendermintRPCBalanceClient, Coins
+from chain_events import ChainEventWatcher
+from poll_scheduler import PollScheduler
+from shard_leases import ShardCoordinator
+from balance_history import BalanceHistoryStore
+from database import RoleDatabase
+from discord_rest import DiscordRESTClient, DISCORD_API_BASE
+from member_cache import member_roles
+from role_update_worker import RoleUpdateWorker
+from role_outbox import RoleSyncOutbox, RetryableRoleSyncError, PermanentRoleSyncError, role_sync_error
+from mongo_pool import mongo_clients, WORKLOAD_MONITOR
+
 logger = logging.getLogger(__name__)
 
+# Only the fields the fetch and persist stages need
+WALLET_PROJECTION = {'_id': 1, 'walletAddress': 1, 'discordId': 1, 'lastKnownBalance': 1}
+
+LINKED_WALLET_FILTER = {
+    'walletAddress': {'$exists': True, '$ne': None},
+    'discordId': {'$exists': True, '$ne': None}
+}
+
 class BalanceMonitor:
     def __init__(self):
         # Remove bot dependency - make it completely independent
-        self.client: Optional[MongoClient] = None
-        self.db: Optional[Database] = None
-        self.users_collection: Optional[Collection] = None
-        self.balance_history_collection: Optional[Collection] = None
-        self.roles_collection: Optional[Collection] = None
+        # The monitor runs on its own event loop, so it gets its own async data-access
+        # instance, backed by the monitor pool so sweeps can't starve interactive traffic
+        self.database = RoleDatabase(workload=WORKLOAD_MONITOR)
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self.users_collection: Optional[AsyncIOMotorCollection] = None
+        self.balance_history_collection: Optional[AsyncIOMotorCollection] = None
+        self.roles_collection: Optional[AsyncIOMotorCollection] = None
+        self.history_store: Optional[BalanceHistoryStore] = None
+        # Seconds between balance history rollup refreshes
+        self.rollup_interval = float(os.getenv('BALANCE_ROLLUP_INTERVAL', '300'))
         self.running = False
         self.monitor_thread = None
+        # Optional wallet-space sharding across monitor processes (set up in connect_db)
+        self.sharding_enabled = os.getenv('MONITOR_SHARDING_ENABLED', 'false').lower() == 'true'
+        self.shards: Optional[ShardCoordinator] = None
         
         # Discord API configuration
         self.discord_token = os.getenv('DISCORD_BOT_TOKEN')  # Changed from DISCORD_TOKEN
         self.guild_id = os.getenv('DISCORD_GUILD_ID')
-        self.discord_api_base = 'https://discord.com/api/v10'
+        self.discord_api_base = DISCORD_API_BASE
+        # Rate-limit aware REST client; its session is created lazily on the monitor loop
+        self.discord = DiscordRESTClient.from_env()
+        # Role syncs go through a durable MongoDB outbox (set up in connect_db) unless disabled
+        self.outbox_enabled = os.getenv('ROLE_OUTBOX_ENABLED', 'true').lower() == 'true'
+        self.role_outbox: Optional[RoleSyncOutbox] = None
+        # One long-lived worker applies role updates, keeping only each user's latest
+        self.role_worker = RoleUpdateWorker(
+            self._process_outbox_job if self.outbox_enabled else self._process_queued_role_update,
+            concurrency=int(os.getenv('ROLE_UPDATE_CONCURRENCY', '4'))
+        )
+        # Seconds queued role updates get to finish on shutdown
+        self.role_drain_timeout = float(os.getenv('ROLE_UPDATE_DRAIN_TIMEOUT', '10'))
+        
+        # Osmosis API configuration - a health-scored pool of LCD endpoints
+        self.lcd_pool = LCDEndpointPool.from_env()
+        # Denoms that make up the tracked token balance (e.g. the $CROWDP denom and its IBC forms).
+        # When unset every denom is listed and summed, which is only meaningful for single-asset wallets.
+        self.tracked_denoms = [denom.strip() for denom in os.getenv('TRACKED_DENOMS', '').split(',') if denom.strip()]
+        self.denom_exponent = int(os.getenv('TRACKED_DENOM_EXPONENT', '6'))
+        if not self.tracked_denoms:
+            logger.warning("TRACKED_DENOMS not set - balances will sum every denom held by a wallet")
+        
+        # Balance backend: 'rest' (one LCD call per wallet) or 'rpc' (batched abci_query)
+        self.balance_backend = os.getenv('BALANCE_BACKEND', 'rest').lower()
+        self.rpc_client = TendermintRPCBalanceClient.from_env() if self.balance_backend == 'rpc' else None
+        # Monitoring mode: 'poll' sweeps every wallet each interval, 'events' re-checks only
+        # wallets touched by on-chain transfers and keeps a slow full sweep as a safety net
+        self.monitor_mode = os.getenv('BALANCE_MONITOR_MODE', 'poll').lower()
+        self.event_watcher = ChainEventWatcher.from_env() if self.monitor_mode == 'events' else None
+        default_sweep_interval = '600' if self.event_watcher else '30'
+        self.sweep_interval = float(os.getenv('FULL_SWEEP_INTERVAL') or default_sweep_interval)
+        
+        # Optional proximity scheduler: sweeps only check wallets that are due, polling
+        # near-threshold and recently active wallets often and dormant ones rarely
+        self.scheduler = PollScheduler.from_env() if os.getenv('POLL_SCHEDULER_ENABLED', 'false').lower() == 'true' else None
         
-        # Osmosis API configuration
-        self.osmosis_api_url = os.getenv('OSMOSIS_API_URL', 'https://lcd.testnet.osmosis.zone')
-        self.batch_size = 10  # Process wallets in batches of 10
+        # Operations per unordered bulk_write when persisting balance changes
+        self.write_batch_size = max(1, int(os.getenv('BALANCE_WRITE_BATCH_SIZE', '1000')))
+        
+        # Documents per cursor batch when streaming linked wallets
+        self.cursor_batch_size = int(os.getenv('WALLET_CURSOR_BATCH_SIZE', '500'))
+        
+        # Per-request timeout (seconds) for Osmosis LCD calls
+        self.request_timeout = float(os.getenv('BALANCE_REQUEST_TIMEOUT', '10'))
+        # Adaptive in-flight window: grows while the LCD is healthy, backs off on 429/5xx/timeouts
+        self.limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=int(os.getenv('BALANCE_CHECK_CONCURRENCY', '10')),
+            min_limit=int(os.getenv('BALANCE_CHECK_MIN_CONCURRENCY', '1')),
+            max_limit=int(os.getenv('BALANCE_CHECK_MAX_CONCURRENCY', '50')),
+            latency_target=float(os.getenv('BALANCE_LATENCY_TARGET', '2.0')),
+            name='osmosis-lcd'
+        )
         
     async def connect_db(self):
         """Connect to MongoDB database"""
         try:
-            mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/verifier-db')
-            db_name = os.getenv('MONGODB_DB_NAME', 'verifier-db')
+            await self.database.connect()
+            self.db = self.database.db
+            self.users_collection = self.database.users_collection
+            self.roles_collection = self.database.roles_collection
+            logger.info("Balance monitor connected to MongoDB")
             
-            self.client = MongoClient(mongodb_uri)
-            self.db = self.client[db_name]
-            self.users_collection = self.db['users']
-            self.balance_history_collection = self.db['balance_history']
-            self.roles_collection = self.db['roles']
+            # Time-series history with retention; rollups are refreshed in the background
+            self.history_store = BalanceHistoryStore.from_env(self.db)
+            self.balance_history_collection = self.history_store.collection
+            try:
+                await self.history_store.ensure_collections()
+            except Exception as e:
+                logger.error(f"Failed to set up balance history collections: {e}")
             
-            # Test the connection
-            self.client.admin.command('ping')
-            logger.info("Balance monitor connected to MongoDB")
+            if self.sharding_enabled:
+                self.shards = ShardCoordinator.from_env(self.db)
+            
+            if self.outbox_enabled:
+                self.role_outbox = RoleSyncOutbox.from_env(self.db)
+                try:
+                    await self.role_outbox.ensure_indexes()
+                except Exception as e:
+                    logger.error(f"Failed to set up role sync outbox indexes: {e}")
             
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB in balance monitor: {e}")
             raise
     
-    async def get_linked_wallets(self) -> List[Dict[str, Any]]:
-        """Retrieve all wallet addresses linked to Discord IDs"""
+    async def iter_linked_wallets(self) -> AsyncIterator[Dict[str, Any]]:
+        """Stream wallets linked to Discord IDs, yielding each document as the cursor delivers it"""
+        cursor = self.users_collection.find(
+            LINKED_WALLET_FILTER,
+            WALLET_PROJECTION,
+            batch_size=self.cursor_batch_size
+        )
         try:
-            # Find all users with both walletAddress and discordId
-            users = list(self.users_collection.find({
-                'walletAddress': {'$exists': True, '$ne': None},
-                'discordId': {'$exists': True, '$ne': None}
-            }))
+            async for user in cursor:
+                yield user
+        finally:
+            await cursor.close()
+    
+    def _sum_balances(self, coins: Coins) -> float:
+        """Convert the tracked denoms' base-unit amounts into a display balance"""
+        total_units = 0
+        for denom, amount in coins:
+            if self.tracked_denoms and denom not in self.tracked_denoms:
+                continue
+            total_units += int(amount)
+        return total_units / 10 ** self.denom_exponent
+    
+    async def _fetch_coins_rest(self, session: aiohttp.ClientSession, wallet_address: str,
+                                timeout: aiohttp.ClientTimeout) -> Tuple[Optional[Coins], Optional[LCDResponse]]:
+        """Fetch the wallet's relevant coins over REST, returning the failing response on error"""
+        base_path = f"/cosmos/bank/v1beta1/balances/{wallet_address}"
+        
+        if self.tracked_denoms:
+            # One small by-denom lookup per tracked denom instead of the full balance list
+            responses = await asyncio.gather(*[
+                self.lcd_pool.get(session, f"{base_path}/by_denom", params={'denom': denom}, timeout=timeout)
+                for denom in self.tracked_denoms
+            ])
+            coins = []
+            for response in responses:
+                if response.status != 200:
+                    return None, response
+                balance = (response.data or {}).get('balance') or {}
+                coins.append((balance.get('denom', ''), balance.get('amount', '0')))
+            return coins, None
+        
+        # No tracked denoms: list everything, following pagination only when the node says there is more
+        coins = []
+        params = {'pagination.limit': '200'}
+        while True:
+            response = await self.lcd_pool.get(session, base_path, params=params, timeout=timeout)
+            if response.status != 200:
+                return None, response
+            data = response.data or {}
+            coins.extend((b.get('denom', ''), b.get('amount', '0')) for b in data.get('balances', []))
+            next_key = (data.get('pagination') or {}).get('next_key')
+            if not next_key:
+                return coins, None
+            params = {'pagination.limit': '200', 'pagination.key': next_key}
+    
+    async def get_wallet_balance(self, session: aiohttp.ClientSession, wallet_address: str) -> Optional[float]:
+        """Get wallet balance from Osmosis API, or None if it could not be fetched"""
+        started_at = await self.limiter.acquire()
+        outcome = OUTCOME_ERROR
+        retry_after = None
+        
+        try:
+            timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+            coins, response = await self._fetch_coins_rest(session, wallet_address, timeout)
             
-            logger.info(f"Found {len(users)} linked wallet addresses")
-            return users
+            if coins is not None:
+                outcome = OUTCOME_SUCCESS
+                return self._sum_balances(coins)
             
+            if response.overloaded:
+                outcome = OUTCOME_OVERLOAD
+                if response.headers.get('Retry-After', '').isdigit():
+                    retry_after = float(response.headers['Retry-After'])
+            
+            if response.timed_out:
+                logger.warning(f"Timeout getting balance for {wallet_address} from {response.endpoint}")
+            else:
+                logger.warning(f"Failed to get balance for {wallet_address} from {response.endpoint}: HTTP {response.status}")
+            return None
+                    
         except Exception as e:
-            logger.error(f"Failed to get linked wallets: {e}")
-            return []
+            logger.error(f"Error getting balance for {wallet_address}: {e}")
+            return None
+        finally:
+            await self.limiter.release(started_at, outcome, retry_after)
+    
+    def _build_balance_update(self, wallet: Dict[str, Any], current_balance: Optional[float]) -> Optional[Dict[str, Any]]:
+        """Build a balance update record if the wallet balance changed"""
+        # A failed lookup must not be mistaken for an empty wallet
+        if current_balance is None:
+            return None
+        
+        previous_balance = wallet.get('lastKnownBalance', 0.0)
+        
+        # Account for floating point precision
+        if abs(current_balance - previous_balance) <= 0.000001:
+            return None
+        
+        logger.info(f"Balance change detected for {wallet['walletAddress']}: {previous_balance} -> {current_balance}")
+        return {
+            'userId': wallet['_id'],
+            'discordId': wallet['discordId'],
+            'walletAddress': wallet['walletAddress'],
+            'previousBalance': previous_balance,
+            'currentBalance': current_balance,
+            'balanceChange': current_balance - previous_balance,
+            'timestamp': datetime.utcnow()
+        }
     
-    async def get_wallet_balance(self, session: aiohttp.ClientSession, wallet_address: str) -> float:
-        """Get wallet balance from Osmosis API"""
+    async def get_wallet_balances_rpc(self, session: aiohttp.ClientSession, wallet_addresses: List[str]) -> Dict[str, Optional[float]]:
+        """Get balances for many wallets with one batched JSON-RPC call"""
+        started_at = await self.limiter.acquire()
+        outcome = OUTCOME_ERROR
+        retry_after = None
+        
         try:
-            # Get all balances for the wallet
-            url = f"{self.osmosis_api_url}/cosmos/bank/v1beta1/balances/{wallet_address}"
+            timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+            response = await self.rpc_client.query_balances(session, wallet_addresses, self.tracked_denoms, timeout=timeout)
             
-            async with session.get(url, timeout=10) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    balances = data.get('balances', [])
-                    
-                    # Calculate total balance (sum all denominations)
-                    total_balance = 0.0
-                    for balance in balances:
-                        amount = float(balance.get('amount', 0))
-                        # Convert from micro units to standard units (divide by 1,000,000)
-                        total_balance += amount / 1_000_000
-                    
-                    return total_balance
-                else:
-                    logger.warning(f"Failed to get balance for {wallet_address}: HTTP {response.status}")
-                    return 0.0
-                    
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout getting balance for {wallet_address}")
-            return 0.0
+            if response.status == 200:
+                outcome = OUTCOME_SUCCESS
+                return {
+                    address: self._sum_balances(coins) if coins is not None else None
+                    for address, coins in response.balances.items()
+                }
+            
+            if response.overloaded:
+                outcome = OUTCOME_OVERLOAD
+                if response.headers.get('Retry-After', '').isdigit():
+                    retry_after = float(response.headers['Retry-After'])
+            
+            if response.timed_out:
+                logger.warning(f"Timeout getting balances for {len(wallet_addresses)} wallets over RPC")
+            else:
+                logger.warning(f"Failed to get balances for {len(wallet_addresses)} wallets over RPC: HTTP {response.status}")
+            return {address: None for address in wallet_addresses}
+        
         except Exception as e:
-            logger.error(f"Error getting balance for {wallet_address}: {e}")
-            return 0.0
+            logger.error(f"Error getting balances over RPC: {e}")
+            return {address: None for address in wallet_addresses}
+        finally:
+            await self.limiter.release(started_at, outcome, retry_after)
     
-    async def batch_check_balances(self, wallets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Check balances for all wallets in batches"""
+    async def _fetch_wallets(self, session: aiohttp.ClientSession, wallets: List[Dict[str, Any]]):
+        """Fetch balances for a chunk of wallets, returning (wallet, balance) pairs"""
+        if self.rpc_client:
+            balances = await self.get_wallet_balances_rpc(session, [wallet['walletAddress'] for wallet in wallets])
+            return [(wallet, balances.get(wallet['walletAddress'])) for wallet in wallets]
+        
+        return [(wallet, await self.get_wallet_balance(session, wallet['walletAddress'])) for wallet in wallets]
+    
+    def _collect_completed(self, done, balance_updates: List[Dict[str, Any]]):
+        """Turn finished fetch tasks into balance update records"""
+        for task in done:
+            try:
+                for wallet, current_balance in task.result():
+                    update = self._build_balance_update(wallet, current_balance)
+                    if update:
+                        balance_updates.append(update)
+                    if self.scheduler and current_balance is not None:
+                        self.scheduler.record(wallet['walletAddress'], current_balance, update is not None)
+            except Exception as e:
+                logger.error(f"Error processing wallet balance result: {e}")
+    
+    @staticmethod
+    async def _iterate(wallets: Iterable[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        for wallet in wallets:
+            yield wallet
+    
+    async def batch_check_balances(self, wallets: Union[Iterable[Dict[str, Any]], AsyncIterator[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Check balances concurrently under the adaptive in-flight window.
+
+        ``wallets`` may be a list or an async stream; requests start as soon as
+        the first wallets arrive rather than after the whole set is loaded.
+        """
         balance_updates = []
+        pending = set()
+        checked = 0
+        started_at = time.monotonic()
         
-        async with aiohttp.ClientSession() as session:
-            # Process wallets in batches
-            for i in range(0, len(wallets), self.batch_size):
-                batch = wallets[i:i + self.batch_size]
-                batch_tasks = []
-                
-                for wallet in batch:
-                    wallet_address = wallet['walletAddress']
-                    task = self.get_wallet_balance(session, wallet_address)
-                    batch_tasks.append((wallet, task))
-                
-                # Execute batch concurrently
-                for wallet, task in batch_tasks:
-                    try:
-                        current_balance = await task
-                        previous_balance = wallet.get('lastKnownBalance', 0.0)
-                        
-                        # Check if balance changed
-                        if abs(current_balance - previous_balance) > 0.000001:  # Account for floating point precision
-                            balance_updates.append({
-                                'userId': wallet['_id'],
-                                'discordId': wallet['discordId'],
-                                'walletAddress': wallet['walletAddress'],
-                                'previousBalance': previous_balance,
-                                'currentBalance': current_balance,
-                                'balanceChange': current_balance - previous_balance,
-                                'timestamp': datetime.utcnow()
-                            })
-                            
-                            logger.info(f"Balance change detected for {wallet['walletAddress']}: {previous_balance} -> {current_balance}")
-                    
-                    except Exception as e:
-                        logger.error(f"Error processing wallet {wallet.get('walletAddress', 'unknown')}: {e}")
-                
-                # Small delay between batches to avoid overwhelming the API
-                await asyncio.sleep(0.5)
+        if not hasattr(wallets, '__aiter__'):
+            wallets = self._iterate(wallets)
+        
+        # REST fetches one wallet per request, RPC packs a whole chunk into one call
+        chunk_size = self.rpc_client.batch_size if self.rpc_client else 1
+        
+        connector = aiohttp.TCPConnector(limit=self.limiter.max_limit)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            async def submit(chunk: List[Dict[str, Any]]):
+                nonlocal pending
+                # Wait for a free slot, handling results as soon as they complete
+                while len(pending) >= self.limiter.limit:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    self._collect_completed(done, balance_updates)
+                pending.add(asyncio.create_task(self._fetch_wallets(session, chunk)))
+            
+            chunk = []
+            async for wallet in wallets:
+                checked += 1
+                chunk.append(wallet)
+                if len(chunk) >= chunk_size:
+                    await submit(chunk)
+                    chunk = []
+            if chunk:
+                await submit(chunk)
+            
+            # Drain whatever is still in flight
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                self._collect_completed(done, balance_updates)
+        
+        elapsed = time.monotonic() - started_at
+        rate = checked / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Checked {checked} wallets in {elapsed:.2f}s ({rate:.1f} wallets/s), limiter: {self.limiter.stats()}")
+        if not self.rpc_client:
+            logger.info(f"LCD pool: {self.lcd_pool.stats()}")
         
         return balance_updates
     
+    async def _bulk_write(self, collection: AsyncIOMotorCollection, operations: List[Any], label: str) -> Tuple[int, List[Dict[str, Any]]]:
+        """Run operations as unordered bulk_write batches.
+        
+        Returns the number of successful operations and the per-operation errors,
+        with indexes relative to the full ``operations`` list.
+        """
+        succeeded = 0
+        errors = []
+        
+        for offset in range(0, len(operations), self.write_batch_size):
+            batch = operations[offset:offset + self.write_batch_size]
+            try:
+                result = await collection.bulk_write(batch, ordered=False)
+                succeeded += result.inserted_count + result.matched_count
+            except BulkWriteError as e:
+                details = e.details
+                succeeded += details.get('nInserted', 0) + details.get('nMatched', 0)
+                for write_error in details.get('writeErrors', []):
+                    errors.append({
+                        'index': offset + write_error.get('index', 0),
+                        'code': write_error.get('code'),
+                        'message': write_error.get('errmsg')
+                    })
+            except Exception as e:
+                logger.error(f"Failed {label} bulk write batch at offset {offset}: {e}")
+                errors.extend({'index': offset + i, 'code': None, 'message': str(e)} for i in range(len(batch)))
+        
+        return succeeded, errors
+    
     async def save_balance_history(self, balance_updates: List[Dict[str, Any]]):
-        """Save balance changes to history collection"""
+        """Save balance changes to history and user records with a few bulk round trips"""
         if not balance_updates:
             return
         
         try:
-            # Insert balance history records
-            self.balance_history_collection.insert_many(balance_updates)
-            
-            # Update user records with new balances
-            for update in balance_updates:
-                self.users_collection.update_one(
+            history_ops = [InsertOne(update) for update in balance_updates]
+            user_ops = [
+                UpdateOne(
                     {'_id': update['userId']},
                     {
                         '$set': {
@@ -162,8 +407,19 @@ class BalanceMonitor:
                         }
                     }
                 )
+                for update in balance_updates
+            ]
+            
+            inserted, history_errors = await self._bulk_write(self.balance_history_collection, history_ops, 'balance history')
+            updated, user_errors = await self._bulk_write(self.users_collection, user_ops, 'user balance')
             
-            logger.info(f"Saved {len(balance_updates)} balance updates to database")
+            for label, errors in (('history insert', history_errors), ('user update', user_errors)):
+                for error in errors:
+                    update = balance_updates[error['index']]
+                    logger.error(f"Balance {label} failed for {update['walletAddress']}: [{error['code']}] {error['message']}")
+            
+            logger.info(f"Saved {len(balance_updates)} balance updates to database "
+                        f"({inserted} history records, {updated} user records)")
             
         except Exception as e:
             logger.error(f"Failed to save balance history: {e}")
@@ -174,123 +430,200 @@ class BalanceMonitor:
             if balance <= 0:
                 return []
             
-            # Get all roles from database
-            all_roles = list(self.roles_collection.find({}))
-            
-            # Separate holder roles and amount roles
-            holder_roles = [role for role in all_roles if role['type'] == 'holder']
-            amount_roles = [role for role in all_roles if role['type'] == 'amount']
-            
-            # Filter amount roles that user qualifies for and sort by threshold descending
-            qualified_amount_roles = [
-                role for role in amount_roles 
-                if role.get('amountThreshold', 0) <= balance
-            ]
-            qualified_amount_roles.sort(key=lambda x: x.get('amountThreshold', 0), reverse=True)
-            
-            # User gets holder roles (if balance > 0) + highest qualifying amount role only
-            result_roles = []
-            
-            # Add holder roles if user has any balance
-            if balance > 0:
-                result_roles.extend(holder_roles)
-            
-            # Add only the highest qualifying amount role
-            if qualified_amount_roles:
-                result_roles.append(qualified_amount_roles[0])
-            
-            return result_roles
+            # User gets holder roles (if balance > 0) + highest qualifying amount role only,
+            # resolved by binary search over the catalog's compiled thresholds
+            return self.database.role_catalog.snapshot.eligibility.roles_for_balance(balance)
             
         except Exception as e:
             logger.error(f"Failed to get roles for balance: {e}")
             return []
     
-    async def update_user_roles_direct(self, balance_updates: List[Dict[str, Any]]):
-        """Update Discord roles using direct API calls (independent of bot instance)"""
+    def _role_updates_ready(self) -> bool:
         if not self.discord_token or not self.guild_id:
             logger.error("Discord token or guild ID not configured")
+            return False
+        
+        catalog = self.database.role_catalog
+        if not catalog or not catalog.loaded:
+            logger.warning("Role catalog not loaded yet, skipping role updates")
+            return False
+        return True
+    
+    async def update_user_roles_direct(self, balance_updates: List[Dict[str, Any]]):
+        """Update Discord roles using direct API calls (independent of bot instance)"""
+        if not self._role_updates_ready():
             return
         
-        headers = {
-            'Authorization': f'Bot {self.discord_token}',
-            'Content-Type': 'application/json'
-        }
+        # Resolve eligibility for the whole batch in one pass over the compiled index
+        snapshot = self.database.role_catalog.snapshot
+        eligible_role_ids = snapshot.eligibility.role_ids_for_balances(
+            [update['currentBalance'] for update in balance_updates]
+        )
         
-        async with aiohttp.ClientSession() as session:
-            for update in balance_updates:
-                try:
-                    discord_id = str(update['discordId'])
-                    
-                    # Get member info
-                    member_url = f"{self.discord_api_base}/guilds/{self.guild_id}/members/{discord_id}"
-                    async with session.get(member_url, headers=headers) as response:
-                        if response.status != 200:
-                            logger.warning(f"Member not found or inaccessible: {discord_id}")
-                            continue
-                        
-                        member_data = await response.json()
-                        current_roles = set(member_data.get('roles', []))
-                    
-                    # Get roles user should have based on new balance
-                    qualified_roles = await self.get_roles_for_balance(update['currentBalance'])
-                    qualified_role_ids = {role['discordRoleId'] for role in qualified_roles}
-                    
-                    # Get all managed roles from database
-                    all_managed_roles = list(self.roles_collection.find({}))
-                    all_managed_role_ids = {role['discordRoleId'] for role in all_managed_roles}
-                    
-                    # Current roles the member has that are managed by the bot
-                    current_managed_roles = current_roles & all_managed_role_ids
-                    
-                    # Calculate roles to add and remove
-                    roles_to_add = qualified_role_ids - current_managed_roles
-                    roles_to_remove = current_managed_roles - qualified_role_ids
-                    
-                    # Update roles if there are changes
-                    if roles_to_add or roles_to_remove:
-                        new_roles = (current_roles - roles_to_remove) | roles_to_add
-                        
-                        # Update member roles via API
-                        update_url = f"{self.discord_api_base}/guilds/{self.guild_id}/members/{discord_id}"
-                        payload = {'roles': list(new_roles)}
-                        
-                        async with session.patch(update_url, headers=headers, json=payload) as response:
-                            if response.status == 200:
-                                logger.info(f"Successfully updated roles for user {discord_id}")
-                                if roles_to_add:
-                                    logger.info(f"Added roles: {roles_to_add}")
-                                if roles_to_remove:
-                                    logger.info(f"Removed roles: {roles_to_remove}")
-                            else:
-                                error_text = await response.text()
-                                logger.error(f"Failed to update roles for user {discord_id}: {response.status} - {error_text}")
-                
-                except Exception as e:
-                    logger.error(f"Failed to update roles for user {update.get('discordId', 'unknown')}: {e}")
+        for update, qualified_role_ids in zip(balance_updates, eligible_role_ids):
+            try:
+                await self._apply_role_update(update, snapshot.managed_role_ids, qualified_role_ids)
+            except Exception as e:
+                logger.error(f"Failed to update roles for user {update.get('discordId', 'unknown')}: {e}")
+        
+        logger.info(f"Discord REST: {self.discord.stats()}, member cache: {member_roles.stats()}")
+    
+    async def _apply_role_update(self, update: Dict[str, Any], all_managed_role_ids: FrozenSet[str],
+                                 qualified_role_ids: FrozenSet[str]):
+        """Bring one member's managed roles in line with their eligible roles"""
+        if member_roles.needs_load():
+            await self._load_member_roles()
+        
+        discord_id = str(update['discordId'])
+        
+        # Current roles come from the gateway-fed cache; fall back to a member GET
+        cached_roles = member_roles.get(discord_id)
+        if cached_roles is not None:
+            current_roles = set(cached_roles)
+        else:
+            response = await self.discord.get_member(self.guild_id, discord_id)
+            if response.status == 404:
+                logger.warning(f"Member not found: {discord_id}")
+                return
+            if response.status != 200:
+                raise role_sync_error(response.status, f"member lookup returned {response.status}")
+            
+            current_roles = set(response.data.get('roles', []))
+        
+        # Current roles the member has that are managed by the bot
+        current_managed_roles = current_roles & all_managed_role_ids
+        
+        # Calculate roles to add and remove
+        roles_to_add = qualified_role_ids - current_managed_roles
+        roles_to_remove = current_managed_roles - qualified_role_ids
+        
+        # Update roles if there are changes
+        if roles_to_add or roles_to_remove:
+            new_roles = (current_roles - roles_to_remove) | roles_to_add
+            
+            # Update member roles via API
+            response = await self.discord.edit_member(
+                self.guild_id, discord_id, {'roles': list(new_roles)},
+                reason="Token balance changed"
+            )
+            if response.status == 200:
+                member_roles.set_member(discord_id, response.data.get('roles', new_roles))
+                logger.info(f"Successfully updated roles for user {discord_id}")
+                if roles_to_add:
+                    logger.info(f"Added roles: {roles_to_add}")
+                if roles_to_remove:
+                    logger.info(f"Removed roles: {roles_to_remove}")
+            elif response.status == 404:
+                member_roles.remove_member(discord_id)
+                logger.warning(f"Member left before their roles were updated: {discord_id}")
+            else:
+                raise role_sync_error(response.status, f"role update returned {response.status}: {response.data}")
     
-    def schedule_role_update(self, balance_updates: List[Dict[str, Any]]):
-        """Schedule role updates for users with balance changes"""
+    async def _process_queued_role_update(self, update: Dict[str, Any]):
+        """Role update worker handler"""
+        snapshot = self.database.role_catalog.snapshot
+        if update['catalogVersion'] == snapshot.version:
+            qualified_role_ids = update['eligibleRoleIds']
+        else:
+            # Roles changed while the update was queued
+            qualified_role_ids = snapshot.eligibility.role_ids_for_balance(update['currentBalance'])
+        await self._apply_role_update(update, snapshot.managed_role_ids, qualified_role_ids)
+    
+    async def _process_outbox_job(self, job: Dict[str, Any]):
+        """Role update worker handler for jobs claimed from the durable outbox"""
+        snapshot = self.database.role_catalog.snapshot
+        try:
+            await self._apply_role_update(
+                {'discordId': job['_id'], 'currentBalance': job['currentBalance']},
+                snapshot.managed_role_ids,
+                snapshot.eligibility.role_ids_for_balance(job['currentBalance'])
+            )
+        except PermanentRoleSyncError as e:
+            # Retrying a 403 or an unknown role can't help; park the job for an operator
+            logger.error(f"Role sync for {job['_id']} rejected, giving up: {e}")
+            await self.role_outbox.fail(job, str(e), retryable=False)
+            return
+        except RetryableRoleSyncError as e:
+            logger.warning(f"Role sync for {job['_id']} failed (attempt {job.get('attempts', 0) + 1}): {e}")
+            await self.role_outbox.fail(job, str(e), retryable=True)
+            return
+        except Exception as e:
+            # Unexpected errors are retried too; the backoff keeps a persistent one cheap
+            logger.warning(f"Role sync for {job['_id']} failed (attempt {job.get('attempts', 0) + 1}): {e}")
+            await self.role_outbox.fail(job, str(e), retryable=True)
+            return
+        await self.role_outbox.complete(job)
+    
+    async def _pump_role_outbox(self):
+        """Claim due outbox jobs into the role update worker while it has room"""
+        poll_interval = float(os.getenv('ROLE_OUTBOX_POLL_INTERVAL', '2'))
+        while self.running:
+            claimed = 0
+            try:
+                if self._role_updates_ready():
+                    # Keep a little backlog so workers never idle between claims
+                    room = self.role_worker.concurrency * 2 - self.role_worker.backlog
+                    while claimed < room:
+                        job = await self.role_outbox.claim()
+                        if not job:
+                            break
+                        self.role_worker.submit(job['_id'], job)
+                        claimed += 1
+            except Exception as e:
+                logger.error(f"Failed to claim role sync jobs: {e}")
+            await asyncio.sleep(0.1 if claimed else poll_interval)
+    
+    async def _load_member_roles(self):
+        """Page through the guild member list to seed the member role cache"""
+        member_roles.begin_load()
+        members: Dict[str, List[str]] = {}
+        after = '0'
+        try:
+            while True:
+                response = await self.discord.list_members(self.guild_id, limit=1000, after=after)
+                if response.status != 200:
+                    raise RuntimeError(f"member list returned {response.status}: {response.data}")
+                for member in response.data:
+                    members[member['user']['id']] = member.get('roles', [])
+                if len(response.data) < 1000:
+                    break
+                after = response.data[-1]['user']['id']
+        except Exception as e:
+            member_roles.abort_load()
+            logger.error(f"Failed to load guild members for the role cache: {e}")
+            return
+        member_roles.finish_load(members)
+    
+    async def schedule_role_update(self, balance_updates: List[Dict[str, Any]]):
+        """Schedule role updates for users with balance changes.
+
+        Outbox enqueue failures are raised, since the caller must not record
+        the new balances for jobs that were never written down.
+        """
         if not balance_updates:
             return
         
+        if self.role_outbox:
+            # Durable: survives restarts and is retried until Discord accepts it
+            await self.role_outbox.enqueue(balance_updates)
+            return
+        
         try:
-            # Create a new thread to handle the async role update
-            import threading
-            
-            def run_role_update():
-                # Create a new event loop for this thread
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    loop.run_until_complete(self.update_user_roles_direct(balance_updates))
-                    logger.info("Role update completed successfully")
-                finally:
-                    loop.close()
+            if not self._role_updates_ready():
+                return
             
-            # Run the role update in a separate thread
-            thread = threading.Thread(target=run_role_update)
-            thread.daemon = True
-            thread.start()
+            # Resolve eligibility for the whole batch in one pass, then hand each user's
+            # latest update to the worker (replacing any older one still queued)
+            snapshot = self.database.role_catalog.snapshot
+            eligible_role_ids = snapshot.eligibility.role_ids_for_balances(
+                [update['currentBalance'] for update in balance_updates]
+            )
+            for update, qualified_role_ids in zip(balance_updates, eligible_role_ids):
+                self.role_worker.submit(str(update['discordId']), dict(
+                    update,
+                    eligibleRoleIds=qualified_role_ids,
+                    catalogVersion=snapshot.version
+                ))
             
         except Exception as e:
             logger.error(f"Failed to schedule role update: {e}")
@@ -300,34 +633,178 @@ class BalanceMonitor:
         # This method is now deprecated and replaced by update_user_roles_direct
         await self.update_user_roles_direct(balance_updates)
     
+    async def process_wallets(self, wallets: Union[Iterable[Dict[str, Any]], AsyncIterator[Dict[str, Any]]]) -> int:
+        """Check balances for the given wallets, persist changes and schedule role updates"""
+        balance_updates = await self.batch_check_balances(wallets)
+        
+        if self.shards:
+            # Never act on wallets whose lease was lost while their balances were in flight
+            balance_updates = [update for update in balance_updates if self.shards.owns(update['walletAddress'])]
+        
+        if balance_updates:
+            # Schedule Discord role updates first: if we crash before the balances are
+            # saved, the next sweep sees the change again instead of losing the job
+            try:
+                await self.schedule_role_update(balance_updates)
+            except Exception as e:
+                # Same reasoning: leave lastKnownBalance alone so the next sweep retries
+                logger.error(f"Failed to enqueue role updates, not saving {len(balance_updates)} balance changes: {e}")
+                return 0
+            
+            # Save balance history
+            await self.save_balance_history(balance_updates)
+        
+        return len(balance_updates)
+    
+    async def _sweep_wallets(self, seen_addresses: Set[str]) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the linked wallets this worker owns and that are due for a check"""
+        now = time.monotonic()
+        async for wallet in self.iter_linked_wallets():
+            if self.shards and not self.shards.owns(wallet['walletAddress']):
+                continue
+            seen_addresses.add(wallet['walletAddress'])
+            if self.scheduler and not self.scheduler.is_due(wallet, now):
+                continue
+            yield wallet
+    
     async def monitor_cycle(self):
-        """Single monitoring cycle"""
+        """Single monitoring cycle (full sweep of every linked wallet)"""
         try:
             logger.info("Starting balance monitoring cycle")
             
-            # Get all linked wallets
-            wallets = await self.get_linked_wallets()
-            if not wallets:
-                logger.info("No linked wallets found")
-                return
+            if self.scheduler:
+                self._refresh_scheduler_thresholds()
             
-            # Check balances in batches
-            balance_updates = await self.batch_check_balances(wallets)
+            # Stream linked wallets straight into the fetch stage
+            seen_addresses: Set[str] = set()
+            updates = await self.process_wallets(self._sweep_wallets(seen_addresses))
             
-            if balance_updates:
-                # Save balance history
-                await self.save_balance_history(balance_updates)
-                
-                # Schedule Discord role updates
-                self.schedule_role_update(balance_updates)
-                
-                logger.info(f"Completed balance monitoring cycle: {len(balance_updates)} updates processed")
+            if self.event_watcher:
+                self.event_watcher.set_tracked_addresses(seen_addresses)
+            if self.scheduler:
+                self.scheduler.forget_missing(seen_addresses)
+                logger.info(f"Scheduler tiers: {self.scheduler.stats()}")
+            
+            if not seen_addresses:
+                logger.info("No linked wallets found")
+            elif updates:
+                logger.info(f"Completed balance monitoring cycle: {updates} updates processed")
             else:
                 logger.info("No balance changes detected")
+            logger.info(f"MongoDB pools: {mongo_clients.stats()}")
+            logger.info(f"Role updates: {self.role_worker.stats()}, Discord REST: {self.discord.stats()}, "
+                        f"member cache: {member_roles.stats()}")
         
         except Exception as e:
             logger.error(f"Error in monitoring cycle: {e}")
     
+    def _refresh_scheduler_thresholds(self):
+        """Load amount-role thresholds for the proximity scheduler"""
+        self.scheduler.set_thresholds(self.database.role_catalog.snapshot.amount_thresholds())
+    
+    async def check_touched_wallets(self, wallet_addresses: List[str]):
+        """Re-check only the wallets touched by recent on-chain events"""
+        try:
+            wallets = await self.users_collection.find({
+                'walletAddress': {'$in': wallet_addresses},
+                'discordId': {'$exists': True, '$ne': None}
+            }, WALLET_PROJECTION).to_list(None)
+            if self.shards:
+                wallets = [wallet for wallet in wallets if self.shards.owns(wallet['walletAddress'])]
+            if not wallets:
+                return
+            
+            updates = await self.process_wallets(wallets)
+            logger.info(f"Event-driven check of {len(wallets)} touched wallets: {updates} updates processed")
+        
+        except Exception as e:
+            logger.error(f"Error checking touched wallets: {e}")
+    
+    async def _refresh_shard_leases(self):
+        """Keep shard leases renewed, independent of how long a sweep takes"""
+        while self.running:
+            try:
+                await self.shards.refresh()
+            except Exception as e:
+                logger.error(f"Failed to refresh shard leases: {e}")
+            await asyncio.sleep(self.shards.lease_ttl / 3)
+    
+    async def _refresh_rollups(self):
+        """Keep hourly and daily balance rollups current"""
+        while self.running:
+            # With sharding, only the owner of shard 0 does the (idempotent) rollup work
+            if not self.shards or 0 in self.shards.owned_shards():
+                try:
+                    await self.history_store.run_rollups()
+                except Exception as e:
+                    logger.error(f"Failed to refresh balance history rollups: {e}")
+            await asyncio.sleep(self.rollup_interval)
+    
+    async def _monitor_main(self):
+        """Run full sweeps on the sweep interval and event-driven checks in between"""
+        await self.connect_db()
+        self.role_worker.start()
+        outbox_task = asyncio.create_task(self._pump_role_outbox()) if self.role_outbox else None
+        
+        lease_task = None
+        if self.shards:
+            await self.shards.refresh()
+            lease_task = asyncio.create_task(self._refresh_shard_leases())
+        
+        rollup_task = asyncio.create_task(self._refresh_rollups())
+        
+        if self.event_watcher:
+            self.event_watcher.start()
+        
+        next_sweep = 0.0
+        try:
+            while self.running:
+                try:
+                    now = time.monotonic()
+                    if (now >= next_sweep
+                            or (self.event_watcher and self.event_watcher.resync_needed)
+                            or (self.shards and self.shards.ownership_changed)):
+                        if self.event_watcher:
+                            # Events may have been missed while the subscription was down
+                            self.event_watcher.resync_needed = False
+                        if self.shards:
+                            # Newly acquired shards are swept straight away
+                            self.shards.ownership_changed = False
+                        await self.monitor_cycle()
+                        next_sweep = time.monotonic() + self.sweep_interval
+                        continue
+                    
+                    # Wake at least once a second so stop_monitoring() is honoured promptly
+                    wait = min(1.0, next_sweep - now)
+                    if self.event_watcher:
+                        touched = await self.event_watcher.wait_for_touched(timeout=wait)
+                        if touched:
+                            await self.check_touched_wallets(touched)
+                    else:
+                        await asyncio.sleep(wait)
+                
+                except Exception as e:
+                    logger.error(f"Error in monitor loop: {e}")
+                    await asyncio.sleep(5)  # Wait 5 seconds before retrying
+        finally:
+            rollup_task.cancel()
+            if outbox_task:
+                # Jobs claimed but not finished are picked up again once their lease expires
+                outbox_task.cancel()
+            if self.event_watcher:
+                await self.event_watcher.stop()
+            if lease_task:
+                lease_task.cancel()
+                try:
+                    # Hand our shards to the remaining workers without waiting for expiry
+                    await self.shards.release_all()
+                except Exception as e:
+                    logger.error(f"Failed to release shard leases: {e}")
+            # Let queued role updates finish before the loop closes
+            await self.role_worker.stop(timeout=self.role_drain_timeout)
+            await self.discord.close()
+            await self.database.disconnect()
+    
     def start_monitoring(self):
         """Start the balance monitoring thread"""
         if self.running:
@@ -343,7 +820,12 @@ class BalanceMonitor:
         """Stop the balance monitoring thread"""
         self.running = False
         if self.monitor_thread:
-            self.monitor_thread.join(timeout=5)
+            # The loop notices within a second, then drains role updates and closes its
+            # clients; allow for the drain plus that teardown before giving up on it
+            self.monitor_thread.join(timeout=self.role_drain_timeout + 10)
+            if self.monitor_thread.is_alive():
+                logger.warning("Balance monitoring thread still shutting down, role updates may be cut short")
+                return
         logger.info("Balance monitoring thread stopped")
     
     def _run_monitor_loop(self):
@@ -353,24 +835,9 @@ class BalanceMonitor:
         asyncio.set_event_loop(loop)
         
         try:
-            # Connect to database
-            loop.run_until_complete(self.connect_db())
-            
-            while self.running:
-                try:
-                    # Run monitoring cycle
-                    loop.run_until_complete(self.monitor_cycle())
-                    
-                    # Wait 30 seconds before next cycle
-                    for _ in range(30):
-                        if not self.running:
-                            break
-                        time.sleep(1)
-                
-                except Exception as e:
-                    logger.error(f"Error in monitor loop: {e}")
-                    time.sleep(5)  # Wait 5 seconds before retrying
-        
+            loop.run_until_complete(self._monitor_main())
+        except Exception as e:
+            logger.error(f"Balance monitor loop stopped: {e}")
         finally:
             loop.close()
 
@@ -7,6 +7,7 @@ import asyncio
 import logging
 from database import db
 from balance_monitor import BalanceMonitor
+from member_cache import member_roles
 
 # Load environment variables
 load_dotenv()
@@ -24,6 +25,13 @@ class VerifierBot(commands.Bot):
         # intents.message_content = True
         # intents.members = True
         
+        # Optional: keep a gateway-fed member role cache for the balance monitor.
+        # Needs the privileged Server Members intent enabled in the developer portal.
+        self.member_cache_enabled = os.getenv('MEMBER_ROLE_CACHE_ENABLED', 'false').lower() == 'true'
+        self.guild_id = os.getenv('DISCORD_GUILD_ID')
+        if self.member_cache_enabled:
+            intents.members = True
+        
         super().__init__(
             command_prefix='!',
             intents=intents,
@@ -86,6 +94,8 @@ class VerifierBot(commands.Bot):
     async def on_ready(self):
         """Called when the bot is ready"""
         logger.info(f"Bot is online and ready!")
+        if self.member_cache_enabled:
+            member_roles.gateway_ready()
         await self.change_presence(
             activity=discord.Activity(
                 type=discord.ActivityType.watching,
@@ -93,6 +103,36 @@ class VerifierBot(commands.Bot):
             )
         )
 
+    # Member role cache feed (only active with MEMBER_ROLE_CACHE_ENABLED)
+    
+    def _tracks_member(self, member: discord.Member) -> bool:
+        return self.member_cache_enabled and str(member.guild.id) == self.guild_id
+    
+    @staticmethod
+    def _role_ids(member: discord.Member):
+        # The REST API leaves out @everyone, so the cache does too
+        return [str(role.id) for role in member.roles if not role.is_default()]
+    
+    async def on_resumed(self):
+        if self.member_cache_enabled:
+            member_roles.gateway_resumed()
+    
+    async def on_disconnect(self):
+        if self.member_cache_enabled:
+            member_roles.gateway_disconnected()
+    
+    async def on_member_join(self, member: discord.Member):
+        if self._tracks_member(member):
+            member_roles.set_member(str(member.id), self._role_ids(member))
+    
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if self._tracks_member(after):
+            member_roles.set_member(str(after.id), self._role_ids(after))
+    
+    async def on_member_remove(self, member: discord.Member):
+        if self._tracks_member(member):
+            member_roles.remove_member(str(member.id))
+
 # Initialize bot
 bot = VerifierBot()
 
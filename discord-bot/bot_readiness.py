@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+import discord
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+
+class BotNotReady(Exception):
+    """The bot did not become ready in time to serve a request"""
+
+
+class BotReadiness:
+    """Tracks whether an API process's Discord bot can serve requests.
+
+    The bot counts as ready once discord.py reports ready and the configured
+    guild's member list is chunked, and stops being ready while the gateway
+    is reconnecting. Requests arriving before then wait (at most
+    ``max_waiters`` of them, each for up to ``request_timeout`` seconds)
+    instead of being rejected outright. ``live`` only turns false when the
+    bot task itself has died, which no amount of waiting will fix.
+    """
+
+    def __init__(self, bot: discord.Client, guild_id: Optional[int] = None, request_timeout: float = 10,
+                 max_waiters: int = 100):
+        self.bot = bot
+        self.guild_id = guild_id
+        self.request_timeout = request_timeout
+        self.max_waiters = max_waiters
+
+        self._ready: Optional[asyncio.Event] = None
+        self._bot_task: Optional[asyncio.Task] = None
+        self._waiters = 0
+        self._started_at: Optional[float] = None
+        self.ready_after: Optional[float] = None  # seconds from start to first ready
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls, bot: discord.Client) -> 'BotReadiness':
+        guild_id = os.getenv('DISCORD_GUILD_ID', '')
+        return cls(
+            bot,
+            guild_id=int(guild_id) if guild_id.isdigit() else None,
+            request_timeout=float(os.getenv('BOT_READY_REQUEST_TIMEOUT', '10')),
+            max_waiters=int(os.getenv('BOT_READY_MAX_WAITERS', '100'))
+        )
+
+    def _get_ready_event(self) -> asyncio.Event:
+        # Created lazily: instances are built at import time, before the server's loop exists
+        if self._ready is None:
+            self._ready = asyncio.Event()
+        return self._ready
+
+    def start(self, token: str):
+        """Log the bot in on the running loop and follow its gateway state"""
+        self._get_ready_event()
+        self.bot.add_listener(self._on_ready, 'on_ready')
+        self.bot.add_listener(self._on_resumed, 'on_resumed')
+        self.bot.add_listener(self._on_disconnect, 'on_disconnect')
+        self._started_at = time.monotonic()
+        self._bot_task = asyncio.create_task(self.bot.start(token))
+        self._bot_task.add_done_callback(self._on_bot_stopped)
+
+    async def _on_ready(self):
+        guild = self.bot.get_guild(self.guild_id) if self.guild_id else None
+        if guild and not guild.chunked:
+            # Member lookups come from the cache, so wait for the full member list
+            try:
+                await guild.chunk()
+            except Exception as e:
+                logger.error(f"Failed to chunk guild {guild.id}, member lookups may miss: {e}")
+        if self.ready_after is None:
+            self.ready_after = time.monotonic() - self._started_at
+            logger.info(f"Discord bot ready after {self.ready_after:.1f}s")
+        self._get_ready_event().set()
+
+    async def _on_resumed(self):
+        if self.ready_after is not None:
+            self._get_ready_event().set()
+
+    async def _on_disconnect(self):
+        self._get_ready_event().clear()
+
+    def _on_bot_stopped(self, task: asyncio.Task):
+        self._get_ready_event().clear()
+        if not task.cancelled() and task.exception():
+            logger.error(f"Discord bot stopped: {task.exception()}")
+
+    @property
+    def live(self) -> bool:
+        return self._bot_task is None or not self._bot_task.done()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready is not None and self._ready.is_set() and self.live and not self.bot.is_closed()
+
+    async def wait_for_startup(self):
+        """Hold app startup until the bot is ready, up to BOT_STARTUP_TIMEOUT seconds"""
+        startup_timeout = float(os.getenv('BOT_STARTUP_TIMEOUT', '30'))
+        if not await self.wait(startup_timeout):
+            logger.warning(f"Discord bot not ready after {startup_timeout}s, serving with requests held until it is")
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for the bot to become ready"""
+        try:
+            await asyncio.wait_for(self._get_ready_event().wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def wait_for_request(self):
+        """Hold a request until the bot is ready, raising BotNotReady when that can't happen in time"""
+        if self.ready:
+            return
+        if not self.live:
+            self.rejected += 1
+            raise BotNotReady("Discord bot is not running")
+        if self._waiters >= self.max_waiters:
+            self.rejected += 1
+            raise BotNotReady("Too many requests waiting for the Discord bot")
+
+        self._waiters += 1
+        try:
+            if not await self.wait(self.request_timeout):
+                self.rejected += 1
+                raise BotNotReady("Discord bot is not ready")
+        finally:
+            self._waiters -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.live:
+            state = 'stopped'
+        elif self.ready:
+            state = 'ready'
+        else:
+            state = 'starting' if self.ready_after is None else 'reconnecting'
+        return {
+            'state': state,
+            'live': self.live,
+            'ready': self.ready,
+            'waiting_requests': self._waiters,
+            'rejected_requests': self.rejected,
+            'ready_after_seconds': round(self.ready_after, 1) if self.ready_after is not None else None,
+        }
+
+
+def require_ready(readiness: BotReadiness) -> Callable:
+    """FastAPI dependency holding requests that arrive while the bot is starting or reconnecting"""
+    async def dependency():
+        try:
+            await readiness.wait_for_request()
+        except BotNotReady as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '5'})
+        return True
+    return dependency
+
+
+def health_router(readiness: BotReadiness) -> APIRouter:
+    """``/health/live`` and ``/health/ready`` probes for an API process's bot"""
+    router = APIRouter()
+
+    @router.get("/health/live")
+    async def liveness_check():
+        """Liveness probe: fails only when the bot task has died and the process needs a restart"""
+        if not readiness.live:
+            return JSONResponse(status_code=503, content={"live": False})
+        return {"live": True}
+
+    @router.get("/health/ready")
+    async def readiness_check():
+        """Readiness probe: fails while the bot is starting or reconnecting, so no traffic is routed here"""
+        stats = readiness.stats()
+        return JSONResponse(status_code=200 if stats['ready'] else 503, content=stats)
+
+    return router
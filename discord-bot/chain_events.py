@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Set, Iterable
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Event attributes that identify wallets whose bank balance may have changed
+BALANCE_EVENT_KEYS = (
+    'transfer.recipient',
+    'transfer.sender',
+    'coin_received.receiver',
+    'coin_spent.spender',
+)
+
+
+def _websocket_url(rpc_url: str) -> str:
+    """Derive the Tendermint websocket endpoint from an RPC URL"""
+    url = rpc_url.rstrip('/')
+    if url.startswith('https://'):
+        url = 'wss://' + url[len('https://'):]
+    elif url.startswith('http://'):
+        url = 'ws://' + url[len('http://'):]
+    return url if url.endswith('/websocket') else f"{url}/websocket"
+
+
+class ChainEventWatcher:
+    """Subscribes to Tendermint Tx events and collects tracked wallets touched by them"""
+
+    def __init__(self, rpc_url: str, query: str = "tm.event='Tx'", debounce: float = 1.0):
+        self.ws_url = _websocket_url(rpc_url)
+        self.query = query
+        self.debounce = debounce
+
+        self._tracked: Set[str] = set()
+        self._touched: Set[str] = set()
+        self._touched_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+        # Set after a reconnect: events may have been missed, so a full sweep is due
+        self.resync_needed = False
+        self.events_seen = 0
+        self.connected = False
+
+    @classmethod
+    def from_env(cls) -> 'ChainEventWatcher':
+        return cls(
+            os.getenv('OSMOSIS_WS_URL') or os.getenv('OSMOSIS_RPC_URL', 'https://rpc.testnet.osmosis.zone'),
+            debounce=float(os.getenv('EVENT_DEBOUNCE_SECONDS', '1.0'))
+        )
+
+    def set_tracked_addresses(self, addresses: Iterable[str]):
+        """Replace the set of wallet addresses we care about"""
+        self._tracked = set(addresses)
+
+    def start(self):
+        """Start the subscription task on the running event loop"""
+        if self._task and not self._task.done():
+            return
+        self._running = True
+        self._touched_event = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def wait_for_touched(self, timeout: float) -> List[str]:
+        """Wait up to ``timeout`` for touched wallets and return them, coalescing a short burst"""
+        if not self._touched_event:
+            await asyncio.sleep(timeout)
+            return []
+
+        try:
+            await asyncio.wait_for(self._touched_event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return []
+
+        # Let the rest of the block's events (and the LCD node) catch up before querying
+        await asyncio.sleep(self.debounce)
+
+        touched = list(self._touched)
+        self._touched.clear()
+        self._touched_event.clear()
+        return touched
+
+    def _handle_message(self, message: Dict):
+        """Match an event notification against the tracked addresses"""
+        events = (message.get('result') or {}).get('events') or {}
+        if not events:
+            return
+
+        self.events_seen += 1
+        for key in BALANCE_EVENT_KEYS:
+            for address in events.get(key, []):
+                if address in self._tracked:
+                    self._touched.add(address)
+
+        if self._touched:
+            self._touched_event.set()
+
+    async def _run(self):
+        """Keep a subscription open, reconnecting with backoff"""
+        backoff = 1
+        first_connection = True
+
+        while self._running:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(self.ws_url, heartbeat=30) as ws:
+                        await ws.send_json({
+                            'jsonrpc': '2.0',
+                            'method': 'subscribe',
+                            'id': 1,
+                            'params': {'query': self.query}
+                        })
+                        logger.info(f"Subscribed to chain events at {self.ws_url}")
+                        self.connected = True
+                        backoff = 1
+
+                        if not first_connection:
+                            self.resync_needed = True
+                        first_connection = False
+
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                self._handle_message(json.loads(msg.data))
+                            elif msg.type in (aiohttp.WSMsgType.ERROR, aiohttp.WSMsgType.CLOSED):
+                                break
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Chain event subscription error: {e}")
+
+            self.connected = False
+            if self._running:
+                logger.info(f"Reconnecting to chain events in {backoff}s")
+                await asyncio.sleep(backoff)
+                backoff = min(60, backoff * 2)
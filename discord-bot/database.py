@@ -1,41 +1,59 @@
-import os
 import logging
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-from pymongo import MongoClient
-from pymongo.collection import Collection
-from pymongo.database import Database
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+from mongo_pool import mongo_clients, WORKLOAD_INTERACTIVE
+from role_catalog import RoleCatalog
 
 logger = logging.getLogger(__name__)
 
 class RoleDatabase:
-    def __init__(self):
-        self.client: Optional[MongoClient] = None
-        self.db: Optional[Database] = None
-        self.roles_collection: Optional[Collection] = None
+    """Async (motor) data-access layer shared by the bot, the balance monitor and the API servers.
+
+    Motor binds a client to the event loop it is first used on, so code running
+    on a different loop (the balance monitor thread) creates its own instance.
+    Clients come from the process-wide connection manager, with a separate
+    pool per workload. Role reads are served from an in-memory ``RoleCatalog``
+    once it has loaded.
+    """
+    def __init__(self, workload: str = WORKLOAD_INTERACTIVE):
+        self.workload = workload
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self.roles_collection: Optional[AsyncIOMotorCollection] = None
+        self.users_collection: Optional[AsyncIOMotorCollection] = None
+        self.role_catalog: Optional[RoleCatalog] = None
         
     async def connect(self):
         """Connect to MongoDB database"""
         try:
-            mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/verifier-db')
-            db_name = os.getenv('MONGODB_DB_NAME', 'verifier-db')
+            db_name = mongo_clients.db_name
             
-            self.client = MongoClient(mongodb_uri)
+            self.client = mongo_clients.get_client(self.workload)
             self.db = self.client[db_name]
             self.roles_collection = self.db['roles']
+            self.users_collection = self.db['users']
             
             # Test the connection
-            self.client.admin.command('ping')
+            await self.client.admin.command('ping')
             logger.info(f"Successfully connected to MongoDB: {db_name}")
             
+            self.role_catalog = RoleCatalog.from_env(self.roles_collection)
+            await self.role_catalog.start()
+            
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
             raise
     
     async def disconnect(self):
         """Disconnect from MongoDB"""
+        if self.role_catalog:
+            await self.role_catalog.stop()
         if self.client:
-            self.client.close()
+            mongo_clients.release(self.client)
+            self.client = None
             logger.info("Disconnected from MongoDB")
     
     async def add_role(self, name: str, discord_role_id: str, amount_threshold: Optional[float] = None, 
@@ -56,8 +74,9 @@ class RoleDatabase:
             if created_by:
                 role_data['createdBy'] = created_by
             
-            result = self.roles_collection.insert_one(role_data)
+            result = await self.roles_collection.insert_one(role_data)
             role_data['_id'] = str(result.inserted_id)
+            await self._refresh_catalog()
             
             logger.info(f"Added role: {name} (ID: {discord_role_id})")
             return role_data
@@ -69,7 +88,10 @@ class RoleDatabase:
     async def get_all_roles(self) -> List[Dict[str, Any]]:
         """Get all roles from the database"""
         try:
-            roles = list(self.roles_collection.find({}))
+            if self._catalog_ready():
+                return [dict(role) for role in self.role_catalog.snapshot.roles]
+            
+            roles = await self.roles_collection.find({}).to_list(None)
             # Convert ObjectId to string
             for role in roles:
                 role['_id'] = str(role['_id'])
@@ -84,7 +106,10 @@ class RoleDatabase:
     async def get_roles_by_type(self, role_type: str) -> List[Dict[str, Any]]:
         """Get roles by type (holder or amount)"""
         try:
-            roles = list(self.roles_collection.find({'type': role_type}))
+            if self._catalog_ready():
+                return [dict(role) for role in self.role_catalog.snapshot.roles if role.get('type') == role_type]
+            
+            roles = await self.roles_collection.find({'type': role_type}).to_list(None)
             # Convert ObjectId to string
             for role in roles:
                 role['_id'] = str(role['_id'])
@@ -104,6 +129,10 @@ class RoleDatabase:
                 logger.info(f"Balance {balance} is 0 or negative, returning no roles")
                 return []
             
+            if self._catalog_ready():
+                snapshot = self.role_catalog.snapshot
+                return [dict(role) for role in snapshot.holder_roles + snapshot.qualifying_amount_roles(balance)]
+            
             # Get all holder roles (no amount threshold) and amount roles where balance meets threshold
             query = {
                 '$or': [
@@ -112,7 +141,7 @@ class RoleDatabase:
                 ]
             }
             
-            roles = list(self.roles_collection.find(query))
+            roles = await self.roles_collection.find(query).to_list(None)
             # Convert ObjectId to string
             for role in roles:
                 role['_id'] = str(role['_id'])
@@ -127,7 +156,10 @@ class RoleDatabase:
     async def role_exists(self, discord_role_id: str) -> bool:
         """Check if a role with the given Discord role ID already exists"""
         try:
-            count = self.roles_collection.count_documents({'discordRoleId': discord_role_id})
+            if self._catalog_ready():
+                return discord_role_id in self.role_catalog.snapshot.managed_role_ids
+            
+            count = await self.roles_collection.count_documents({'discordRoleId': discord_role_id})
             return count > 0
             
         except Exception as e:
@@ -137,10 +169,11 @@ class RoleDatabase:
     async def delete_role(self, discord_role_id: str) -> bool:
         """Delete a role by Discord role ID"""
         try:
-            result = self.roles_collection.delete_one({'discordRoleId': discord_role_id})
+            result = await self.roles_collection.delete_one({'discordRoleId': discord_role_id})
             success = result.deleted_count > 0
             
             if success:
+                await self._refresh_catalog()
                 logger.info(f"Deleted role with Discord ID: {discord_role_id}")
             else:
                 logger.warning(f"No role found with Discord ID: {discord_role_id}")
@@ -156,14 +189,15 @@ class RoleDatabase:
         try:
             updates['updatedAt'] = datetime.utcnow()
             
-            result = self.roles_collection.find_one_and_update(
+            result = await self.roles_collection.find_one_and_update(
                 {'discordRoleId': discord_role_id},
                 {'$set': updates},
-                return_document=True
+                return_document=ReturnDocument.AFTER
             )
             
             if result:
                 result['_id'] = str(result['_id'])
+                await self._refresh_catalog()
                 logger.info(f"Updated role with Discord ID: {discord_role_id}")
             else:
                 logger.warning(f"No role found with Discord ID: {discord_role_id}")
@@ -174,5 +208,34 @@ class RoleDatabase:
             logger.error(f"Failed to update role: {e}")
             raise
 
+    def _catalog_ready(self) -> bool:
+        return self.role_catalog is not None and self.role_catalog.loaded
+    
+    async def _refresh_catalog(self):
+        """Reflect our own role writes immediately instead of waiting for the change stream"""
+        if not self.role_catalog:
+            return
+        try:
+            await self.role_catalog.reload()
+        except Exception as e:
+            logger.warning(f"Failed to refresh role catalog after write: {e}")
+
+    async def get_discord_id_by_wallet(self, wallet_address: str) -> Optional[int]:
+        """Get the Discord user ID linked to a wallet address"""
+        try:
+            user = await self.users_collection.find_one(
+                {'walletAddress': wallet_address},
+                {'discordId': 1}
+            )
+            
+            if user and user.get('discordId'):
+                return int(user['discordId'])
+            
+            return None
+            
+        except Exception as e:
+            logger.error(f"Failed to look up wallet {wallet_address}: {e}")
+            raise
+
 # Global database instance
 db = RoleDatabase()
\ No newline at end of file
@@ -0,0 +1,241 @@
+import asyncio
+import collections
+import json as jsonlib
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import aiohttp
+from multidict import CIMultiDict
+
+logger = logging.getLogger(__name__)
+
+DISCORD_API_BASE = 'https://discord.com/api/v10'
+
+# Route parameters that give a route its own rate limit per value
+MAJOR_PARAMETERS = ('guild_id', 'channel_id', 'webhook_id')
+
+# Cloudflare bans IPs that make this many 401/403/429 responses in ten minutes
+INVALID_REQUEST_LIMIT = 10000
+INVALID_REQUEST_WINDOW = 600
+
+
+@dataclass
+class DiscordResponse:
+    """Outcome of one Discord REST call, after any rate-limit retries"""
+    status: Optional[int]  # None when no HTTP response was received
+    data: Any = None
+    headers: CIMultiDict = field(default_factory=CIMultiDict)
+
+    @property
+    def ok(self) -> bool:
+        return self.status is not None and 200 <= self.status < 300
+
+
+class RateLimitBucket:
+    """Remaining requests and reset time for one Discord rate-limit bucket.
+
+    The lock queues requests for the bucket. While the remaining budget is
+    unknown (first use, or after a reset) the lock is held for the whole
+    request, so a burst cannot turn into a burst of 429s; once Discord has
+    told us the budget, requests only hold it long to reserve a slot.
+    """
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0  # monotonic
+
+    def delay(self) -> float:
+        """Seconds to wait before the next request is allowed"""
+        if self.remaining is None or self.remaining > 0:
+            return 0.0
+        return max(0.0, self.reset_at - time.monotonic())
+
+    def reserve(self) -> bool:
+        """Take a slot after waiting out ``delay``; False while the budget is unknown"""
+        if self.remaining is not None and self.remaining <= 0:
+            # The window has reset but we don't know the new budget until the next response
+            self.remaining = None
+        if self.remaining is None:
+            return False
+        self.remaining -= 1
+        return True
+
+    def update(self, headers) -> None:
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_after = headers.get('X-RateLimit-Reset-After')
+        if remaining is not None:
+            self.remaining = int(remaining)
+        if reset_after is not None:
+            self.reset_at = time.monotonic() + float(reset_after)
+
+
+class DiscordRESTClient:
+    """Rate-limit aware client for the Discord HTTP API.
+
+    Requests are grouped by route (method, path template and major parameter)
+    until Discord reports the route's ``X-RateLimit-Bucket``, after which all
+    routes sharing that bucket share one queue. Exhausted buckets wait for
+    their reset instead of sending a request that will be rejected; 429s are
+    retried after ``retry_after``, honouring the global limit; and 401/403/429
+    responses are counted against Cloudflare's invalid-request budget.
+    """
+
+    def __init__(self, token: str, api_base: str = DISCORD_API_BASE, max_retries: int = 3,
+                 invalid_request_limit: int = INVALID_REQUEST_LIMIT):
+        self.token = token
+        self.api_base = api_base.rstrip('/')
+        self.max_retries = max_retries
+        self.invalid_request_limit = invalid_request_limit
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._route_buckets: Dict[str, str] = {}
+        self._buckets: Dict[Tuple[str, str], RateLimitBucket] = {}
+        self._global_reset_at = 0.0
+        self._invalid_requests: Deque[float] = collections.deque()
+
+        self.requests = 0
+        self.rate_limited = 0
+        self.throttled_seconds = 0.0
+
+    @classmethod
+    def from_env(cls) -> 'DiscordRESTClient':
+        return cls(
+            os.getenv('DISCORD_BOT_TOKEN', ''),
+            max_retries=int(os.getenv('DISCORD_REST_MAX_RETRIES', '3')),
+            # Stop well short of the ban threshold by default
+            invalid_request_limit=int(os.getenv('DISCORD_INVALID_REQUEST_LIMIT', '8000'))
+        )
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(headers={
+                'Authorization': f'Bot {self.token}',
+                'User-Agent': 'DiscordBot (https://github.com/404Piyush/CROWDP-Interchain-Token-Gate, 1.0)'
+            })
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _bucket_for(self, route: str, major: str) -> RateLimitBucket:
+        key = (self._route_buckets.get(route, route), major)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = RateLimitBucket()
+            self._buckets[key] = bucket
+        return bucket
+
+    def _invalid_budget_exhausted(self) -> bool:
+        cutoff = time.monotonic() - INVALID_REQUEST_WINDOW
+        while self._invalid_requests and self._invalid_requests[0] < cutoff:
+            self._invalid_requests.popleft()
+        return len(self._invalid_requests) >= self.invalid_request_limit
+
+    async def _throttle(self, seconds: float):
+        if seconds <= 0:
+            return
+        self.throttled_seconds += seconds
+        await asyncio.sleep(seconds)
+
+    async def request(self, method: str, path: str, json: Any = None, reason: Optional[str] = None,
+                      query: Optional[Dict[str, Any]] = None, **params) -> DiscordResponse:
+        """Call ``path`` (a template such as ``/guilds/{guild_id}/members/{user_id}``) with ``params``"""
+        route = f"{method} {path}"
+        major = ':'.join(str(params[name]) for name in MAJOR_PARAMETERS if name in params)
+        url = self.api_base + path.format(**params)
+        headers = {'X-Audit-Log-Reason': reason} if reason else None
+
+        for attempt in range(self.max_retries + 1):
+            if self._invalid_budget_exhausted():
+                logger.error(f"Discord invalid request budget exhausted, not sending {route}")
+                return DiscordResponse(None)
+
+            bucket = self._bucket_for(route, major)
+            lock = bucket.lock
+            await lock.acquire()
+            held = True
+            try:
+                await self._throttle(max(bucket.delay(), self._global_reset_at - time.monotonic()))
+                if bucket.reserve():
+                    lock.release()
+                    held = False
+                response = await self._send(method, url, json, headers, query)
+                if response.status is None:
+                    return response
+
+                bucket_hash = response.headers.get('X-RateLimit-Bucket')
+                if bucket_hash and self._route_buckets.get(route) != bucket_hash:
+                    # Later requests on this route queue behind the shared bucket
+                    self._route_buckets[route] = bucket_hash
+                    bucket = self._buckets.setdefault((bucket_hash, major), bucket)
+                bucket.update(response.headers)
+            finally:
+                if held:
+                    lock.release()
+
+            scope = response.headers.get('X-RateLimit-Scope', 'user')
+            if response.status in (401, 403) or (response.status == 429 and scope != 'shared'):
+                self._invalid_requests.append(time.monotonic())
+
+            if response.status != 429:
+                return response
+
+            self.rate_limited += 1
+            body = response.data if isinstance(response.data, dict) else {}
+            retry_after = float(body.get('retry_after') or response.headers.get('Retry-After') or 1)
+            if body.get('global') or response.headers.get('X-RateLimit-Global'):
+                self._global_reset_at = time.monotonic() + retry_after
+                logger.warning(f"Hit Discord global rate limit, pausing all requests for {retry_after:.2f}s")
+            else:
+                bucket.remaining = 0
+                bucket.reset_at = time.monotonic() + retry_after
+                logger.warning(f"Rate limited on {route} ({scope} scope), retrying in {retry_after:.2f}s")
+
+            if attempt == self.max_retries:
+                return response
+
+        return DiscordResponse(None)
+
+    async def _send(self, method: str, url: str, json: Any, headers: Optional[Dict[str, str]],
+                    query: Optional[Dict[str, Any]]) -> DiscordResponse:
+        self.requests += 1
+        try:
+            async with self._get_session().request(method, url, json=json, headers=headers, params=query) as response:
+                text = await response.text()
+                try:
+                    data = jsonlib.loads(text) if text else None
+                except ValueError:
+                    data = text
+                return DiscordResponse(response.status, data, CIMultiDict(response.headers))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Discord request to {url} failed: {e}")
+            return DiscordResponse(None)
+
+    async def get_member(self, guild_id: str, user_id: str) -> DiscordResponse:
+        return await self.request('GET', '/guilds/{guild_id}/members/{user_id}', guild_id=guild_id, user_id=user_id)
+
+    async def list_members(self, guild_id: str, limit: int = 1000, after: str = '0') -> DiscordResponse:
+        """One page of guild members (requires the GUILD_MEMBERS intent)"""
+        return await self.request('GET', '/guilds/{guild_id}/members', query={'limit': limit, 'after': after},
+                                  guild_id=guild_id)
+
+    async def edit_member(self, guild_id: str, user_id: str, payload: Dict[str, Any],
+                          reason: Optional[str] = None) -> DiscordResponse:
+        return await self.request('PATCH', '/guilds/{guild_id}/members/{user_id}', json=payload, reason=reason,
+                                  guild_id=guild_id, user_id=user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        self._invalid_budget_exhausted()  # trims the window
+        return {
+            'requests': self.requests,
+            'rate_limited': self.rate_limited,
+            'throttled_seconds': round(self.throttled_seconds, 2),
+            'invalid_requests_10m': len(self._invalid_requests),
+            'buckets': len(self._buckets),
+        }
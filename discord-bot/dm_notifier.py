@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RoleNotification:
+    """Role changes waiting to be DMed to one user, merged until it is sent"""
+    user_id: str
+    wallet_address: str
+    added_roles: List[str] = field(default_factory=list)
+    removed_roles: List[str] = field(default_factory=list)
+    due_at: float = 0.0
+
+    def merge(self, wallet_address: str, added_roles: List[str], removed_roles: List[str]):
+        """Fold a later change in; a role added then removed (or vice versa) cancels out"""
+        self.wallet_address = wallet_address
+        for role in added_roles:
+            if role in self.removed_roles:
+                self.removed_roles.remove(role)
+            elif role not in self.added_roles:
+                self.added_roles.append(role)
+        for role in removed_roles:
+            if role in self.added_roles:
+                self.added_roles.remove(role)
+            elif role not in self.removed_roles:
+                self.removed_roles.append(role)
+
+    @property
+    def empty(self) -> bool:
+        return not self.added_roles and not self.removed_roles
+
+    def signature(self) -> Tuple[frozenset, frozenset]:
+        return frozenset(self.added_roles), frozenset(self.removed_roles)
+
+
+class RoleNotificationQueue:
+    """Background sender for role-change DMs.
+
+    Each user's changes are held for ``batch_window`` seconds so a burst of
+    updates becomes one message, and a message identical to one sent to the
+    same user within ``dedup_window`` seconds is dropped. A single sender
+    task sends at most one DM every ``send_interval`` seconds, keeping well
+    under Discord's DM limits; callers only record the change and return.
+    """
+
+    def __init__(self, send: Callable[[RoleNotification], Awaitable[None]], batch_window: float = 10,
+                 dedup_window: float = 3600, send_interval: float = 1.0):
+        self.send = send
+        self.batch_window = batch_window
+        self.dedup_window = dedup_window
+        self.send_interval = send_interval
+
+        self._pending: Dict[str, RoleNotification] = {}
+        self._recent: Dict[str, Tuple[Tuple[frozenset, frozenset], float]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._draining = False
+        self._sending = False
+
+        self.sent = 0
+        self.merged = 0
+        self.deduplicated = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the sender task on the running event loop"""
+        if self._task and not self._task.done():
+            return
+        self._draining = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10):
+        """Send held notifications without waiting out their batch window for up to ``timeout`` seconds, then stop"""
+        task, self._task = self._task, None
+        if not task:
+            return
+        self._draining = True
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout
+        while (self._pending or self._sending) and not task.done() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._pending:
+            logger.warning(f"Stopping role notifications with {len(self._pending)} still unsent")
+
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    def notify(self, user_id: str, wallet_address: str, added_roles: List[str], removed_roles: List[str]):
+        """Queue a DM about these role changes; no-op changes send nothing"""
+        if not added_roles and not removed_roles:
+            return
+
+        notification = self._pending.get(user_id)
+        if notification:
+            notification.merge(wallet_address, added_roles, removed_roles)
+            self.merged += 1
+            return
+
+        notification = RoleNotification(user_id, wallet_address, due_at=time.monotonic() + self.batch_window)
+        notification.merge(wallet_address, added_roles, removed_roles)
+        self._pending[user_id] = notification
+        if self._wakeup:
+            self._wakeup.set()
+
+    def _is_duplicate(self, notification: RoleNotification) -> bool:
+        now = time.monotonic()
+        for user_id in [uid for uid, (_, sent_at) in self._recent.items() if now - sent_at > self.dedup_window]:
+            del self._recent[user_id]
+        recent = self._recent.get(notification.user_id)
+        return recent is not None and recent[0] == notification.signature()
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            due = min(self._pending.values(), key=lambda n: n.due_at, default=None)
+            if due is None or (due.due_at > now and not self._draining):
+                self._wakeup.clear()
+                timeout = due.due_at - now if due else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            del self._pending[due.user_id]
+            if due.empty or self._is_duplicate(due):
+                self.deduplicated += 1
+                continue
+
+            self._sending = True
+            try:
+                await self.send(due)
+                self._recent[due.user_id] = (due.signature(), time.monotonic())
+                self.sent += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Failed to send role notification to {due.user_id}: {e}")
+            finally:
+                self._sending = False
+            await asyncio.sleep(self.send_interval)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pending': len(self._pending),
+            'sent': self.sent,
+            'merged': self.merged,
+            'deduplicated': self.deduplicated,
+            'failed': self.failed,
+        }
@@ -0,0 +1,156 @@
+import asyncio
+import collections
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyKeyConflict(Exception):
+    """The key was already used for a request with a different body"""
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    status_code: int
+    body: Any
+    expires_at: float  # monotonic
+
+
+class IdempotencyStore:
+    """Replays the response of a request made with the same Idempotency-Key.
+
+    The first request for a key runs; concurrent duplicates await its result
+    instead of running again, and later duplicates within ``ttl`` seconds get
+    the stored response back. Only responses below 500 are stored, so server
+    errors and "not ready yet" answers can be retried for real. Completed
+    responses can additionally be written to a MongoDB collection so they
+    survive restarts and are shared between API processes; in-flight
+    deduplication is per process.
+    """
+
+    def __init__(self, ttl: float = 600, collection: Optional[AsyncIOMotorCollection] = None):
+        self.ttl = ttl
+        self.collection = collection
+
+        # Insertion order is expiry order, since every entry gets the same ttl
+        self._completed: 'collections.OrderedDict[str, StoredResponse]' = collections.OrderedDict()
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+        self.executed = 0
+        self.replayed = 0
+        self.joined = 0
+
+    async def use_mongo(self, collection: AsyncIOMotorCollection):
+        """Also persist completed responses in ``collection``, expired by a TTL index"""
+        await collection.create_index('expiresAt', expireAfterSeconds=0)
+        self.collection = collection
+
+    async def run(self, key: str, fingerprint: str,
+                  producer: Callable[[], Awaitable[Tuple[int, Any]]]) -> Tuple[int, Any, bool]:
+        """Return ``(status_code, body, replayed)`` for the request identified by ``key``"""
+        self._prune()
+
+        stored = self._get(key)
+        if stored is None and key not in self._in_flight:
+            await self._load(key)
+            # Re-read: a duplicate may have finished while MongoDB answered
+            stored = self._get(key)
+        if stored:
+            self._check_fingerprint(stored.fingerprint, fingerprint)
+            self.replayed += 1
+            return stored.status_code, stored.body, True
+
+        in_flight = self._in_flight.get(key)
+        if in_flight:
+            self._check_fingerprint(in_flight[0], fingerprint)
+            self.joined += 1
+            status_code, body = await asyncio.shield(in_flight[1])
+            return status_code, body, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (fingerprint, future)
+        try:
+            status_code, body = await producer()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody was waiting
+            raise
+        else:
+            future.set_result((status_code, body))
+            if status_code < 500:
+                await self._store(key, StoredResponse(fingerprint, status_code, body, time.monotonic() + self.ttl))
+            return status_code, body, False
+        finally:
+            self.executed += 1
+            del self._in_flight[key]
+
+    @staticmethod
+    def _check_fingerprint(expected: str, fingerprint: str):
+        if expected != fingerprint:
+            raise IdempotencyKeyConflict("Idempotency-Key was already used with a different request")
+
+    def _get(self, key: str) -> Optional[StoredResponse]:
+        stored = self._completed.get(key)
+        # Entries loaded from MongoDB can sit behind newer ones and outlive a prune
+        return stored if stored and stored.expires_at > time.monotonic() else None
+
+    def _prune(self):
+        now = time.monotonic()
+        while self._completed:
+            key, stored = next(iter(self._completed.items()))
+            if stored.expires_at > now:
+                break
+            del self._completed[key]
+
+    async def _load(self, key: str) -> Optional[StoredResponse]:
+        if self.collection is None:
+            return None
+        try:
+            document = await self.collection.find_one({'_id': key, 'expiresAt': {'$gt': datetime.utcnow()}})
+        except Exception as e:
+            logger.error(f"Failed to read idempotency key {key}: {e}")
+            return None
+        if not document:
+            return None
+
+        remaining = (document['expiresAt'] - datetime.utcnow()).total_seconds()
+        stored = StoredResponse(document['fingerprint'], document['statusCode'], document['body'],
+                                time.monotonic() + remaining)
+        self._completed[key] = stored
+        return stored
+
+    async def _store(self, key: str, stored: StoredResponse):
+        self._completed[key] = stored
+        self._completed.move_to_end(key)
+        if self.collection is None:
+            return
+        try:
+            await self.collection.replace_one(
+                {'_id': key},
+                {
+                    'fingerprint': stored.fingerprint,
+                    'statusCode': stored.status_code,
+                    'body': stored.body,
+                    'expiresAt': datetime.utcnow() + timedelta(seconds=self.ttl)
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to persist idempotency key {key}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'stored': len(self._completed),
+            'in_flight': len(self._in_flight),
+            'executed': self.executed,
+            'replayed': self.replayed,
+            'joined': self.joined,
+            'mongo': self.collection is not None,
+        }
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LCDResponse:
+    """Outcome of a single logical LCD request"""
+    status: Optional[int]  # None when no HTTP response was received
+    endpoint: str
+    data: Optional[Dict[str, Any]] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    timed_out: bool = False
+    hedged: bool = False
+
+    @property
+    def overloaded(self) -> bool:
+        """Whether the failure points at an unhealthy or throttling node"""
+        return self.timed_out or self.status is None or self.status == 429 or self.status >= 500
+
+    @property
+    def usable(self) -> bool:
+        """A response the caller should act on (success or a genuine client error)"""
+        return not self.overloaded
+
+
+class LCDEndpoint:
+    """A single LCD node with live latency and error tracking"""
+
+    def __init__(self, url: str, window: int = 100):
+        self.url = url.rstrip('/')
+        self._latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)
+        self._latency_ewma: Optional[float] = None
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def record(self, latency: float, success: bool):
+        """Record the result of a request sent to this endpoint"""
+        self._outcomes.append(success)
+        if success:
+            self.record_latency(latency)
+            self.consecutive_failures = 0
+            return
+
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= 3:
+            # Back off a repeatedly failing node: 5s, 10s, 20s ... capped at 5 minutes
+            cooldown = min(300, 5 * 2 ** (self.consecutive_failures - 3))
+            self.cooldown_until = time.monotonic() + cooldown
+
+    def record_latency(self, latency: float):
+        """Add a latency sample without counting the request as a success or failure"""
+        self._latencies.append(latency)
+        self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for ok in self._outcomes if not ok) / len(self._outcomes)
+
+    @property
+    def cooling_down(self) -> bool:
+        return self.cooldown_until > time.monotonic()
+
+    def p95(self) -> Optional[float]:
+        """95th percentile latency of successful requests, once enough samples exist"""
+        if len(self._latencies) < 20:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def score(self) -> float:
+        """Lower is better: expected latency inflated by the recent error rate"""
+        latency = self._latency_ewma if self._latency_ewma is not None else 0.5
+        score = latency * (1 + 4 * self.error_rate)
+        if self.cooling_down:
+            score += 1000
+        return score
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            'url': self.url,
+            'score': round(self.score(), 3),
+            'latency_ewma_ms': round(self._latency_ewma * 1000, 1) if self._latency_ewma is not None else None,
+            'latency_p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+            'error_rate': round(self.error_rate, 3),
+            'cooling_down': self.cooling_down
+        }
+
+
+class LCDEndpointPool:
+    """Health-scored pool of LCD endpoints with failover and hedged requests"""
+
+    def __init__(self, urls: List[str], hedging: bool = True, default_hedge_delay: float = 1.0,
+                 max_attempts: int = 3):
+        if not urls:
+            raise ValueError("At least one LCD endpoint is required")
+
+        self.endpoints = [LCDEndpoint(url) for url in urls]
+        self.hedging = hedging and len(self.endpoints) > 1
+        self.default_hedge_delay = default_hedge_delay
+        self.max_attempts = max(1, min(max_attempts, len(self.endpoints)))
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.failovers = 0
+
+    @classmethod
+    def from_env(cls) -> 'LCDEndpointPool':
+        """Build the pool from OSMOSIS_API_URLS, falling back to the single OSMOSIS_API_URL"""
+        urls = [url.strip() for url in os.getenv('OSMOSIS_API_URLS', '').split(',') if url.strip()]
+        if not urls:
+            urls = [os.getenv('OSMOSIS_API_URL', 'https://lcd.testnet.osmosis.zone')]
+
+        return cls(
+            urls,
+            hedging=os.getenv('LCD_HEDGING_ENABLED', 'true').lower() == 'true',
+            default_hedge_delay=float(os.getenv('LCD_HEDGE_DELAY', '1.0')),
+            max_attempts=int(os.getenv('LCD_MAX_ATTEMPTS', '3'))
+        )
+
+    def ranked(self) -> List[LCDEndpoint]:
+        """Endpoints ordered best-first by live score"""
+        return sorted(self.endpoints, key=lambda endpoint: endpoint.score())
+
+    def _hedge_delay(self, endpoint: LCDEndpoint) -> float:
+        p95 = endpoint.p95()
+        return max(0.05, p95 if p95 is not None else self.default_hedge_delay)
+
+    async def _request(self, session: aiohttp.ClientSession, endpoint: LCDEndpoint, path: str,
+                       params: Optional[Dict[str, str]], timeout: aiohttp.ClientTimeout) -> LCDResponse:
+        """Send a request to one endpoint and record its health"""
+        started_at = time.monotonic()
+        try:
+            async with session.get(f"{endpoint.url}{path}", params=params, timeout=timeout) as response:
+                data = await response.json(content_type=None) if response.status == 200 else None
+                result = LCDResponse(response.status, endpoint.url, data, dict(response.headers))
+        except asyncio.CancelledError:
+            # Lost a hedge race: the elapsed time is still a lower bound on this node's latency,
+            # but says nothing about whether the node would have answered
+            endpoint.record_latency(time.monotonic() - started_at)
+            raise
+        except asyncio.TimeoutError:
+            result = LCDResponse(None, endpoint.url, timed_out=True)
+        except aiohttp.ClientError as e:
+            logger.debug(f"LCD request to {endpoint.url} failed: {e}")
+            result = LCDResponse(None, endpoint.url)
+        except ValueError as e:
+            # A 200 with a truncated or non-JSON body: as unusable as no response at all
+            logger.debug(f"LCD response from {endpoint.url} was not valid JSON: {e}")
+            result = LCDResponse(None, endpoint.url)
+
+        endpoint.record(time.monotonic() - started_at, result.usable)
+        return result
+
+    async def get(self, session: aiohttp.ClientSession, path: str, params: Optional[Dict[str, str]] = None,
+                  timeout: Optional[aiohttp.ClientTimeout] = None) -> LCDResponse:
+        """GET a path from the best endpoint, hedging past its p95 and failing over on errors"""
+        candidates = self.ranked()[:self.max_attempts]
+        in_flight: Dict[asyncio.Task, LCDEndpoint] = {}
+        next_index = 0
+        hedged = False
+        last_result: Optional[LCDResponse] = None
+
+        def launch():
+            nonlocal next_index
+            endpoint = candidates[next_index]
+            next_index += 1
+            task = asyncio.create_task(self._request(session, endpoint, path, params, timeout))
+            in_flight[task] = endpoint
+
+        launch()
+        try:
+            while in_flight:
+                wait_timeout = None
+                if self.hedging and not hedged and next_index < len(candidates):
+                    wait_timeout = self._hedge_delay(candidates[0])
+
+                done, _ = await asyncio.wait(list(in_flight), timeout=wait_timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Primary is slower than its usual p95 - race a second endpoint
+                    hedged = True
+                    self.hedges_sent += 1
+                    launch()
+                    continue
+
+                for task in done:
+                    endpoint = in_flight.pop(task)
+                    result = task.result()
+                    if result.usable:
+                        if endpoint is not candidates[0]:
+                            result.hedged = hedged
+                            if hedged:
+                                self.hedges_won += 1
+                        return result
+                    last_result = result
+
+                # Fail over, keeping a hedge racing if one had already been sent
+                wanted = 2 if hedged else 1
+                while len(in_flight) < wanted and next_index < len(candidates):
+                    self.failovers += 1
+                    launch()
+
+            return last_result
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'endpoints': [endpoint.stats() for endpoint in self.ranked()],
+            'hedges_sent': self.hedges_sent,
+            'hedges_won': self.hedges_won,
+            'failovers': self.failovers
+        }
@@ -0,0 +1,120 @@
+import logging
+import threading
+from typing import Dict, FrozenSet, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class MemberRoleCache:
+    """Role ids of every guild member, kept current by gateway events.
+
+    The bot's gateway connection feeds member add/update/remove events in on
+    its own loop, while the balance monitor reads from its thread, so all state
+    sits behind a lock. The cache only answers while the gateway feed is live
+    and a full member list has been loaded since the last (re-)identify; until
+    then ``get`` returns None and callers fetch the member over REST.
+
+    A full load runs concurrently with the event feed, so members touched by
+    an event while the list is being paged keep the event's (newer) roles.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._roles: Dict[str, FrozenSet[str]] = {}
+        self._live = False
+        self._loaded = False
+        self._load_requested = False
+        self._loading = False
+        self._touched_during_load: Set[str] = set()
+
+        self.hits = 0
+        self.misses = 0
+
+    # Gateway side (bot event loop)
+
+    def gateway_ready(self):
+        """A new gateway session started; events may have been missed, so reload"""
+        with self._lock:
+            self._live = True
+            self._loaded = False
+            self._load_requested = True
+
+    def gateway_resumed(self):
+        """The session resumed; Discord replays missed events, so the cache stays valid"""
+        with self._lock:
+            self._live = True
+
+    def gateway_disconnected(self):
+        with self._lock:
+            self._live = False
+
+    def set_member(self, user_id: str, role_ids: Iterable[str]):
+        with self._lock:
+            self._roles[user_id] = frozenset(role_ids)
+            if self._loading:
+                self._touched_during_load.add(user_id)
+
+    def remove_member(self, user_id: str):
+        with self._lock:
+            self._roles.pop(user_id, None)
+            if self._loading:
+                self._touched_during_load.add(user_id)
+
+    # Consumer side (balance monitor)
+
+    @property
+    def ready(self) -> bool:
+        return self._live and self._loaded
+
+    def needs_load(self) -> bool:
+        with self._lock:
+            return self._live and self._load_requested and not self._loading
+
+    def begin_load(self):
+        with self._lock:
+            self._loading = True
+            self._load_requested = False
+            self._touched_during_load = set()
+
+    def finish_load(self, members: Dict[str, Iterable[str]]):
+        """Install a freshly paged member list, keeping newer event-fed entries"""
+        with self._lock:
+            roles = {user_id: frozenset(role_ids) for user_id, role_ids in members.items()}
+            for user_id in self._touched_during_load:
+                if user_id in self._roles:
+                    roles[user_id] = self._roles[user_id]
+                else:
+                    roles.pop(user_id, None)
+            self._roles = roles
+            self._loading = False
+            self._loaded = True
+            self._touched_during_load = set()
+        logger.info(f"Member role cache loaded {len(roles)} members")
+
+    def abort_load(self):
+        with self._lock:
+            self._loading = False
+            self._load_requested = True
+
+    def get(self, user_id: str) -> Optional[FrozenSet[str]]:
+        """Cached role ids for a member, or None when the cache can't answer"""
+        with self._lock:
+            roles = self._roles.get(user_id) if self._live and self._loaded else None
+            if roles is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return roles
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self._live and self._loaded,
+                'members': len(self._roles),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+# Global member role cache, fed by the bot's gateway connection
+member_roles = MemberRoleCache()
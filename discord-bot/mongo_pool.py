@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Interactive traffic: bot commands and the HTTP APIs
+WORKLOAD_INTERACTIVE = 'interactive'
+# Background traffic: balance sweeps, bulk writes, leases and rollups
+WORKLOAD_MONITOR = 'monitor'
+
+DEFAULT_DB_NAME = 'verifier-db'
+
+_WORKLOAD_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    WORKLOAD_INTERACTIVE: {
+        'max_pool_size': 20,
+        'min_pool_size': 2,
+        'wait_queue_timeout_ms': 2000,
+        'server_selection_timeout_ms': 5000,
+        'socket_timeout_ms': 10000,
+        'read_preference': 'primary',
+        'write_concern': 'majority',
+    },
+    WORKLOAD_MONITOR: {
+        'max_pool_size': 10,
+        'min_pool_size': 0,
+        'wait_queue_timeout_ms': 30000,
+        'server_selection_timeout_ms': 10000,
+        'socket_timeout_ms': 60000,
+        'read_preference': 'primary',
+        'write_concern': '1',
+    },
+}
+
+
+@dataclass
+class WorkloadPoolConfig:
+    """Connection pool settings for one workload"""
+    max_pool_size: int
+    min_pool_size: int
+    wait_queue_timeout_ms: int
+    server_selection_timeout_ms: int
+    socket_timeout_ms: int
+    read_preference: str
+    write_concern: str
+
+    @classmethod
+    def from_env(cls, workload: str) -> 'WorkloadPoolConfig':
+        """Read ``MONGODB_<WORKLOAD>_*`` overrides on top of the workload defaults"""
+        defaults = _WORKLOAD_DEFAULTS.get(workload, _WORKLOAD_DEFAULTS[WORKLOAD_INTERACTIVE])
+        prefix = f"MONGODB_{workload.upper()}_"
+
+        def setting(name: str) -> str:
+            return os.getenv(prefix + name.upper()) or str(defaults[name])
+
+        return cls(
+            max_pool_size=int(setting('max_pool_size')),
+            min_pool_size=int(setting('min_pool_size')),
+            wait_queue_timeout_ms=int(setting('wait_queue_timeout_ms')),
+            server_selection_timeout_ms=int(setting('server_selection_timeout_ms')),
+            socket_timeout_ms=int(setting('socket_timeout_ms')),
+            read_preference=setting('read_preference'),
+            write_concern=setting('write_concern')
+        )
+
+    def client_options(self) -> Dict[str, Any]:
+        write_concern = self.write_concern
+        return {
+            'maxPoolSize': self.max_pool_size,
+            'minPoolSize': self.min_pool_size,
+            'waitQueueTimeoutMS': self.wait_queue_timeout_ms,
+            'serverSelectionTimeoutMS': self.server_selection_timeout_ms,
+            'socketTimeoutMS': self.socket_timeout_ms,
+            'readPreference': self.read_preference,
+            'w': int(write_concern) if write_concern.isdigit() else write_concern,
+        }
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Tracks connection checkouts for one workload's clients.
+
+    A workload has one client per event loop, all reporting to this listener,
+    so saturation is measured against the combined capacity of those clients.
+    pymongo publishes these events from whichever thread touches the pool, so
+    the counters are guarded by a lock.
+    """
+
+    def __init__(self, workload: str, max_pool_size: int):
+        self.workload = workload
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+
+        self.clients = 0
+
+        self.open_connections = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.checkout_failures = 0
+
+    def client_added(self):
+        with self._lock:
+            self.clients += 1
+
+    def client_removed(self):
+        with self._lock:
+            self.clients = max(0, self.clients - 1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        logger.warning(f"MongoDB {self.workload} pool for {event.address} was cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(0, self.open_connections - 1)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting = max(0, self.waiting - 1)
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.checkout_timeouts += 1
+            else:
+                self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting = max(0, self.waiting - 1)
+            self.checked_out += 1
+            self.checkouts += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            capacity = self.max_pool_size * max(1, self.clients)
+            return {
+                'max_pool_size': self.max_pool_size,
+                'clients': self.clients,
+                'open': self.open_connections,
+                'checked_out': self.checked_out,
+                'peak_checked_out': self.peak_checked_out,
+                'waiting': self.waiting,
+                'peak_waiting': self.peak_waiting,
+                'checkouts': self.checkouts,
+                'checkout_timeouts': self.checkout_timeouts,
+                'checkout_failures': self.checkout_failures,
+                'saturation': round(self.checked_out / capacity, 2) if capacity else 0.0,
+            }
+
+
+class MongoConnectionManager:
+    """Process-wide owner of the MongoDB clients, one pool per workload.
+
+    Each workload gets its own client (and therefore its own connection pool),
+    so bulk monitor traffic queues behind its own pool limit instead of taking
+    connections from bot commands and API requests. Motor binds a client to the
+    event loop it is created on, so clients are kept per (workload, loop).
+    """
+
+    def __init__(self, uri: Optional[str] = None, db_name: Optional[str] = None):
+        # Resolved on first use so a later load_dotenv() is still honoured
+        self._uri = uri
+        self._db_name = db_name
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple[str, asyncio.AbstractEventLoop], AsyncIOMotorClient] = {}
+        self._listeners: Dict[str, PoolStatsListener] = {}
+
+    @property
+    def uri(self) -> str:
+        return self._uri or os.getenv('MONGODB_URI', f'mongodb://localhost:27017/{DEFAULT_DB_NAME}')
+
+    @property
+    def db_name(self) -> str:
+        return self._db_name or os.getenv('MONGODB_DB_NAME', DEFAULT_DB_NAME)
+
+    def get_client(self, workload: str = WORKLOAD_INTERACTIVE) -> AsyncIOMotorClient:
+        """Client for ``workload`` on the running event loop, created on first use"""
+        loop = asyncio.get_running_loop()
+        key = (workload, loop)
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                config = WorkloadPoolConfig.from_env(workload)
+                listener = self._listeners.get(workload)
+                if listener is None:
+                    listener = PoolStatsListener(workload, config.max_pool_size)
+                    self._listeners[workload] = listener
+
+                client = AsyncIOMotorClient(
+                    self.uri,
+                    io_loop=loop,
+                    appname=f"crowdp-{workload}",
+                    event_listeners=[listener],
+                    **config.client_options()
+                )
+                self._clients[key] = client
+                listener.client_added()
+                logger.info(f"Created MongoDB {workload} client (maxPoolSize={config.max_pool_size}, "
+                            f"readPreference={config.read_preference}, w={config.write_concern})")
+        return client
+
+    def get_database(self, workload: str = WORKLOAD_INTERACTIVE) -> AsyncIOMotorDatabase:
+        return self.get_client(workload)[self.db_name]
+
+    def release(self, client: AsyncIOMotorClient):
+        """Close a client and forget it"""
+        with self._lock:
+            for key, existing in list(self._clients.items()):
+                if existing is client:
+                    del self._clients[key]
+                    self._listeners[key[0]].client_removed()
+        client.close()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Pool saturation per workload"""
+        with self._lock:
+            listeners = list(self._listeners.values())
+        return {listener.workload: listener.stats() for listener in listeners}
+
+
+# Global connection manager
+mongo_clients = MongoConnectionManager()
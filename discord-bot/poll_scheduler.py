@@ -0,0 +1,153 @@
+import bisect
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TIER_HOT = 'hot'
+TIER_WARM = 'warm'
+TIER_COLD = 'cold'
+
+
+def _parse_interval_range(value: str, default: Tuple[float, float]) -> Tuple[float, float]:
+    """Parse a "min,max" seconds pair from the environment"""
+    try:
+        low, high = (float(part) for part in value.split(','))
+        return min(low, high), max(low, high)
+    except (ValueError, AttributeError):
+        return default
+
+
+@dataclass
+class WalletPollState:
+    """What the scheduler remembers about a wallet between checks"""
+    balance: float
+    last_checked: float
+    last_changed: Optional[float] = None
+    volatility: float = 0.0  # EWMA of absolute balance changes
+    next_due: float = 0.0
+    tier: str = TIER_HOT
+
+
+class PollScheduler:
+    """Polls wallets near a role threshold or recently active often, and dormant far-away wallets rarely"""
+
+    def __init__(self, intervals: Dict[str, Tuple[float, float]], hot_band: float = 0.05,
+                 warm_band: float = 0.25, active_window: float = 3600):
+        self.intervals = intervals
+        self.hot_band = hot_band
+        self.warm_band = warm_band
+        self.active_window = active_window
+
+        self._thresholds: List[float] = []
+        self._wallets: Dict[str, WalletPollState] = {}
+
+    @classmethod
+    def from_env(cls) -> 'PollScheduler':
+        return cls(
+            intervals={
+                TIER_HOT: _parse_interval_range(os.getenv('POLL_INTERVAL_HOT', ''), (30, 60)),
+                TIER_WARM: _parse_interval_range(os.getenv('POLL_INTERVAL_WARM', ''), (120, 600)),
+                TIER_COLD: _parse_interval_range(os.getenv('POLL_INTERVAL_COLD', ''), (900, 3600)),
+            },
+            hot_band=float(os.getenv('POLL_HOT_BAND', '0.05')),
+            warm_band=float(os.getenv('POLL_WARM_BAND', '0.25')),
+            active_window=float(os.getenv('POLL_ACTIVE_WINDOW', '3600'))
+        )
+
+    def set_thresholds(self, thresholds: List[float]):
+        """Amount-role thresholds, refreshed from the roles collection each sweep"""
+        self._thresholds = sorted({float(threshold) for threshold in thresholds if threshold and threshold > 0})
+
+    def _threshold_distance(self, balance: float, volatility: float) -> float:
+        """Distance to the nearest amount threshold, relative to that threshold.
+
+        Recent volatility widens the effective band so a wallet that moves a lot is
+        treated as close even when it currently sits further away.
+        """
+        if not self._thresholds:
+            return float('inf')
+
+        index = bisect.bisect_left(self._thresholds, balance)
+        neighbours = self._thresholds[max(0, index - 1):index + 1]
+        return min(max(0.0, abs(balance - threshold) - volatility) / threshold for threshold in neighbours)
+
+    def _classify(self, state: WalletPollState, now: float) -> Tuple[str, float]:
+        """Pick a tier and a 0..1 position inside it (0 = most urgent)"""
+        if state.last_changed is not None and now - state.last_changed < self.active_window:
+            return TIER_HOT, (now - state.last_changed) / self.active_window
+
+        distance = self._threshold_distance(state.balance, state.volatility)
+        if distance <= self.hot_band:
+            return TIER_HOT, distance / self.hot_band if self.hot_band else 0.0
+        if distance <= self.warm_band:
+            return TIER_WARM, (distance - self.hot_band) / (self.warm_band - self.hot_band)
+        return TIER_COLD, 1.0
+
+    def is_due(self, wallet: Dict[str, Any], now: Optional[float] = None) -> bool:
+        """Whether the wallet should be checked in this sweep"""
+        now = time.monotonic() if now is None else now
+        state = self._wallets.get(wallet['walletAddress'])
+        if state is None:
+            state = self._seed(wallet, now)
+            if state is None:
+                # No balance on record - check it now to learn where it sits
+                return True
+        return now >= state.next_due
+
+    def _seed(self, wallet: Dict[str, Any], now: float) -> Optional[WalletPollState]:
+        """Place a wallet this process hasn't checked yet from its stored ``lastKnownBalance``.
+
+        Near-threshold wallets are due straight away. The rest get a first check
+        spread across their tier's interval, so a restart doesn't poll every
+        dormant wallet at the fastest cadence at once.
+        """
+        balance = wallet.get('lastKnownBalance')
+        if balance is None:
+            return None
+
+        state = WalletPollState(balance=float(balance), last_checked=now)
+        state.tier, _ = self._classify(state, now)
+        if state.tier == TIER_HOT:
+            state.next_due = now
+        else:
+            state.next_due = now + random.uniform(0, self.intervals[state.tier][1])
+        self._wallets[wallet['walletAddress']] = state
+        return state
+
+    def record(self, wallet_address: str, balance: float, changed: bool, now: Optional[float] = None):
+        """Update a wallet's state after a successful balance check and schedule its next one"""
+        now = time.monotonic() if now is None else now
+        state = self._wallets.get(wallet_address)
+
+        if state is None:
+            state = WalletPollState(balance=balance, last_checked=now)
+            self._wallets[wallet_address] = state
+        elif changed:
+            state.volatility = 0.7 * state.volatility + 0.3 * abs(balance - state.balance)
+
+        if changed:
+            state.last_changed = now
+        state.balance = balance
+        state.last_checked = now
+
+        state.tier, position = self._classify(state, now)
+        low, high = self.intervals[state.tier]
+        state.next_due = now + low + (high - low) * min(1.0, max(0.0, position))
+
+    def forget_missing(self, wallet_addresses):
+        """Drop state for wallets that are no longer linked"""
+        keep = set(wallet_addresses)
+        for address in list(self._wallets):
+            if address not in keep:
+                del self._wallets[address]
+
+    def stats(self) -> Dict[str, int]:
+        counts = {TIER_HOT: 0, TIER_WARM: 0, TIER_COLD: 0}
+        for state in self._wallets.values():
+            counts[state.tier] += 1
+        return counts
@@ -1,15 +1,19 @@
 import asyncio
+import hashlib
+import json
 import logging
 import os
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any, Annotated
+from typing import Optional, List, Dict, Any, Annotated, Tuple
 
 import discord
 from discord.ext import commands
 from discord import app_commands
-from fastapi import FastAPI, HTTPException, Header, Depends, status
+from fastapi import FastAPI, HTTPException, Header, Depends, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 from pymongo import MongoClient
@@ -25,7 +29,13 @@ load_dotenv()
 
 # Import custom modules
 from database import db
+from mongo_pool import mongo_clients
 from role_commands import RoleCommands
+from role_jobs import RoleJobQueue, JobQueueFull
+from dm_notifier import RoleNotification, RoleNotificationQueue
+from idempotency import IdempotencyStore, IdempotencyKeyConflict
+from bot_readiness import BotReadiness, require_ready, health_router
+from balance_history import BalanceHistoryStore, ROLLUP_PERIODS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -45,9 +55,17 @@ class RoleAssignmentResponse(BaseModel):
     assigned_roles: List[str]
     message: str
 
+class BatchRoleAssignmentRequest(BaseModel):
+    assignments: List[PermanentRoleAssignmentRequest]
+    # Bulk re-verification and migrations usually shouldn't DM everyone, so it's opt-in
+    notify: bool = False
+
 # Discord bot instance
 bot_instance = None
 
+# Rollup reader for balance history, created once the database is connected
+balance_history: Optional[BalanceHistoryStore] = None
+
 # API Key authentication
 async def verify_api_key(x_api_key: Annotated[str, Header()] = None):
     """Verify API key for protected endpoints"""
@@ -153,17 +171,23 @@ class RoleAssignmentBot(commands.Bot):
 
 # Initialize bot
 discord_bot = RoleAssignmentBot()
+bot_readiness = BotReadiness.from_env(discord_bot)
+require_bot_ready = require_ready(bot_readiness)
+app.include_router(health_router(bot_readiness))
 
 @app.on_event("startup")
 async def startup_event():
     """Start the Discord bot when FastAPI starts"""
-    global bot_instance
+    global bot_instance, balance_history
     bot_instance = discord_bot
     
     # Initialize database connection
     try:
         await db.connect()
         logger.info("Database connection initialized successfully")
+        balance_history = BalanceHistoryStore.from_env(db.db)
+        if os.getenv('IDEMPOTENCY_MONGO_ENABLED', 'false').lower() == 'true':
+            await idempotency_store.use_mongo(db.db[os.getenv('IDEMPOTENCY_COLLECTION', 'idempotency_keys')])
     except Exception as e:
         logger.error(f"Failed to initialize database connection: {e}")
         raise HTTPException(status_code=500, detail="Database connection failed")
@@ -174,180 +198,400 @@ async def startup_event():
         raise HTTPException(status_code=500, detail="Discord bot token not configured")
     
     # Start bot in background
-    asyncio.create_task(discord_bot.start(token))
+    bot_readiness.start(token)
+    role_jobs.start()
+    role_notifications.start()
     
-    # Wait for bot to be ready
-    await asyncio.sleep(3)
+    # Wait for the gateway ready and member chunking; requests arriving later are held until then
+    await bot_readiness.wait_for_startup()
 
-@app.post("/assign-permanent-roles", response_model=RoleAssignmentResponse)
-async def assign_permanent_roles(request: PermanentRoleAssignmentRequest, _: bool = Depends(verify_api_key)):
-    """Assign permanent Discord roles to a user based on their token holdings"""
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Finish accepted role jobs and held notifications before the bot goes away"""
+    # Jobs can add notifications, so drain them first
+    await role_jobs.stop(timeout=float(os.getenv('ROLE_JOB_DRAIN_TIMEOUT', '10')))
+    await role_notifications.stop(timeout=float(os.getenv('ROLE_DM_DRAIN_TIMEOUT', '10')))
+
+@dataclass
+class RoleReconciliation:
+    """Outcome of bringing a member's token-gated roles in line with their eligible roles"""
+    assigned_roles: List[str] = field(default_factory=list)  # names of eligible roles the member now has
+    added_roles: List[str] = field(default_factory=list)  # names of roles given by this reconciliation
+    failed_roles: List[str] = field(default_factory=list)  # eligible role ids that could not be given
+    removed_roles: List[str] = field(default_factory=list)  # names of stale managed roles taken away
+
+async def reconcile_member_roles(guild: discord.Guild, member: discord.Member, role_ids: List[str],
+                                 wallet_address: str) -> RoleReconciliation:
+    """Compute the member's final role set once and apply it with a single member edit"""
+    result = RoleReconciliation()
+    
+    # Permission and hierarchy are checked once per request
+    me = guild.me
+    can_manage_roles = me.guild_permissions.manage_roles
+    top_position = me.top_role.position
+    if not can_manage_roles:
+        logger.error("Bot does not have 'Manage Roles' permission")
+    
+    def assignable(role: discord.Role) -> bool:
+        return can_manage_roles and role.position < top_position and not role.managed
+    
+    current_roles = {role.id: role for role in member.roles if not role.is_default()}
+    wanted_ids = set()
+    to_add: List[discord.Role] = []
+    
+    for role_id in role_ids:
+        try:
+            role = guild.get_role(int(role_id))
+        except ValueError as e:
+            logger.error(f"Invalid role ID {role_id}: {str(e)}")
+            result.failed_roles.append(role_id)
+            continue
+        
+        if not role:
+            logger.warning(f"Role with ID {role_id} not found in server")
+            result.failed_roles.append(role_id)
+            continue
+        
+        wanted_ids.add(role.id)
+        if role.id in current_roles:
+            logger.info(f"User {member.display_name} already has role {role.name}")
+            result.assigned_roles.append(role.name)
+        elif not assignable(role):
+            logger.error(f"Cannot assign role {role.name} - missing permission or role is higher than bot's highest role")
+            result.failed_roles.append(role_id)
+        else:
+            to_add.append(role)
+    
+    # Token-gated roles the member holds but no longer qualifies for (served from the role catalog)
+    to_remove: List[discord.Role] = []
     try:
-        logger.info(f"Starting role assignment for discord_id: {request.discord_id}, wallet: {request.wallet_address}, role_ids: {request.role_ids}")
+        managed_role_ids = {role.get('discordRoleId') for role in await db.get_all_roles() if role.get('discordRoleId')}
+        for role in current_roles.values():
+            if str(role.id) in managed_role_ids and role.id not in wanted_ids:
+                if assignable(role):
+                    to_remove.append(role)
+                else:
+                    logger.error(f"Cannot remove role {role.name} - missing permission or role is higher than bot's highest role")
+    except Exception as e:
+        logger.error(f"Failed to fetch roles from database for cleanup: {str(e)}")
+        # Continue without role cleanup if database fails
+    
+    if not to_add and not to_remove:
+        return result
+    
+    final_roles = [role for role in current_roles.values() if role not in to_remove] + to_add
+    try:
+        await member.edit(roles=final_roles, reason=f"Token verification - Wallet: {wallet_address}")
+        result.assigned_roles.extend(role.name for role in to_add)
+        result.added_roles.extend(role.name for role in to_add)
+        result.removed_roles.extend(role.name for role in to_remove)
+        logger.info(f"Updated roles for {member.display_name}: "
+                    f"added {[role.name for role in to_add]}, removed {[role.name for role in to_remove]}")
+    except (discord.Forbidden, discord.HTTPException) as e:
+        logger.error(f"Failed to update roles for {member.display_name}: {str(e)}")
+        result.failed_roles.extend(str(role.id) for role in to_add)
+    
+    return result
+
+def get_verification_guild() -> discord.Guild:
+    """Resolve the configured guild, raising HTTPException when the bot can't serve role requests"""
+    if not bot_instance or not bot_instance.is_ready():
+        logger.error("Discord bot is not ready")
+        raise HTTPException(status_code=503, detail="Discord bot is not ready")
+    
+    guild_id_str = os.getenv('DISCORD_GUILD_ID')
+    logger.info(f"Guild ID from env: {guild_id_str}")
+    
+    if not guild_id_str:
+        logger.error("DISCORD_GUILD_ID environment variable not set")
+        raise HTTPException(status_code=500, detail="DISCORD_GUILD_ID environment variable not set")
+    
+    try:
+        guild_id = int(guild_id_str)
+        logger.info(f"Parsed guild ID: {guild_id}")
+    except ValueError as e:
+        logger.error(f"Invalid DISCORD_GUILD_ID: {guild_id_str}, error: {str(e)}")
+        raise HTTPException(status_code=500, detail="DISCORD_GUILD_ID must be a valid integer")
+        
+    guild = bot_instance.get_guild(guild_id)
+    logger.info(f"Guild object: {guild}")
+    
+    if not guild:
+        logger.error(f"Discord server not found for guild ID: {guild_id}")
+        raise HTTPException(status_code=404, detail="Discord server not found")
+    
+    return guild
+
+async def send_role_notification(notification: RoleNotification):
+    """DM a member the role changes batched up for them by the notification queue"""
+    user_id = int(notification.user_id)
+    user = discord_bot.get_user(user_id) or await discord_bot.fetch_user(user_id)
+    try:
+        embed = discord.Embed(
+            title="🎉 Roles Assigned Successfully!" if notification.added_roles else "🔄 Roles Updated",
+            description="Your Discord roles have been updated based on your token holdings.",
+            color=0x14b8a6  # teal-500
+        )
         
-        if not bot_instance or not bot_instance.is_ready():
-            logger.error("Discord bot is not ready")
-            raise HTTPException(status_code=503, detail="Discord bot is not ready")
+        if notification.added_roles:
+            embed.add_field(
+                name="✅ Assigned Roles",
+                value="\n".join([f"• {role}" for role in notification.added_roles]),
+                inline=False
+            )
+        
+        if notification.removed_roles:
+            embed.add_field(
+                name="➖ Removed Roles",
+                value="\n".join([f"• {role}" for role in notification.removed_roles]),
+                inline=False
+            )
+        
+        embed.add_field(
+            name="💰 Wallet Address",
+            value=f"`{notification.wallet_address}`",
+            inline=False
+        )
         
-        guild_id_str = os.getenv('DISCORD_GUILD_ID')
-        logger.info(f"Guild ID from env: {guild_id_str}")
+        embed.set_footer(text="Thank you for connecting your wallet to CrowdPunk!")
+        embed.set_thumbnail(url="https://cdn.discordapp.com/emojis/1234567890123456789.png")  # Optional: Add server icon
         
-        if not guild_id_str:
-            logger.error("DISCORD_GUILD_ID environment variable not set")
-            raise HTTPException(status_code=500, detail="DISCORD_GUILD_ID environment variable not set")
+        await user.send(embed=embed)
+        logger.info(f"Sent DM notification to {user} about role assignment")
         
+    except discord.Forbidden:
+        logger.warning(f"Could not send DM to {user} - DMs may be disabled")
+
+# Role-change DMs are batched per user and paced in the background, off the request path
+role_notifications = RoleNotificationQueue(
+    send_role_notification,
+    batch_window=float(os.getenv('ROLE_DM_BATCH_WINDOW', '10')),
+    dedup_window=float(os.getenv('ROLE_DM_DEDUP_WINDOW', '3600')),
+    send_interval=float(os.getenv('ROLE_DM_SEND_INTERVAL', '1.0'))
+)
+
+def get_verification_member(guild: discord.Guild, discord_id: str) -> discord.Member:
+    """Look the member up in the guild cache, raising HTTPException when they aren't there"""
+    logger.info(f"Looking for member with ID: {discord_id}")
+    member = guild.get_member(int(discord_id))
+    logger.info(f"Member object: {member}")
+    
+    if not member:
+        logger.error(f"User not found in Discord server: {discord_id}")
+        raise HTTPException(status_code=404, detail="User not found in Discord server")
+    
+    return member
+
+async def perform_role_assignment(request: PermanentRoleAssignmentRequest) -> RoleAssignmentResponse:
+    """Reconcile the member's roles and DM them what they were given"""
+    guild = get_verification_guild()
+    member = get_verification_member(guild, request.discord_id)
+    
+    result = await reconcile_member_roles(guild, member, request.role_ids, request.wallet_address)
+    assigned_roles = result.assigned_roles
+    failed_roles = result.failed_roles
+    
+    success_message = f"Successfully assigned {len(assigned_roles)} roles"
+    if failed_roles:
+        success_message += f", failed to assign {len(failed_roles)} roles"
+    
+    # Only actual changes are DMed; re-verifying with the same roles stays quiet
+    role_notifications.notify(request.discord_id, request.wallet_address, result.added_roles, result.removed_roles)
+    
+    return RoleAssignmentResponse(
+        success=len(assigned_roles) > 0,
+        assigned_roles=assigned_roles,
+        message=success_message
+    )
+
+async def run_role_assignment_job(request: PermanentRoleAssignmentRequest) -> Dict[str, Any]:
+    try:
+        return (await perform_role_assignment(request)).dict()
+    except HTTPException as e:
+        # Surface the detail rather than starlette's "404: ..." formatting
+        raise RuntimeError(e.detail)
+
+# Background workers for async-mode role assignments, started with the app
+role_jobs = RoleJobQueue(
+    run_role_assignment_job,
+    workers=int(os.getenv('ROLE_JOB_WORKERS', '4')),
+    max_pending=int(os.getenv('ROLE_JOB_MAX_PENDING', '1000')),
+    retention_seconds=float(os.getenv('ROLE_JOB_RETENTION_SECONDS', '3600'))
+)
+
+# Responses replayed for retried requests that carry the same Idempotency-Key
+idempotency_store = IdempotencyStore(ttl=float(os.getenv('IDEMPOTENCY_TTL_SECONDS', '600')))
+
+async def capture_response(handler) -> Tuple[int, Any]:
+    """Run a handler coroutine, turning its result or HTTPException into (status_code, body)"""
+    try:
+        response = await handler
+    except HTTPException as e:
+        return e.status_code, {'detail': e.detail}
+    if isinstance(response, JSONResponse):
+        return response.status_code, json.loads(response.body)
+    return 200, response.dict()
+
+@app.post("/assign-permanent-roles", response_model=RoleAssignmentResponse)
+async def assign_permanent_roles(request: PermanentRoleAssignmentRequest, _: bool = Depends(verify_api_key),
+                                 __: bool = Depends(require_bot_ready),
+                                 async_mode: bool = Query(False, alias="async"),
+                                 idempotency_key: Annotated[Optional[str], Header(alias="Idempotency-Key")] = None):
+    """Assign permanent Discord roles to a user based on their token holdings.
+    
+    With ``?async=true`` the request is validated and queued, and a 202 with a
+    job id is returned straight away; poll ``GET /jobs/{job_id}`` for the result.
+    Retries sent with the same ``Idempotency-Key`` header wait for or replay the
+    first attempt's response instead of repeating the role edits.
+    """
+    if not idempotency_key:
+        return await handle_role_assignment(request, async_mode)
+    
+    fingerprint = hashlib.sha256(f"{async_mode}:{request.json()}".encode()).hexdigest()
+    try:
+        status_code, body, replayed = await idempotency_store.run(
+            f"assign-permanent-roles:{idempotency_key}", fingerprint,
+            lambda: capture_response(handle_role_assignment(request, async_mode))
+        )
+    except IdempotencyKeyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    headers = {'Idempotent-Replayed': 'true'} if replayed else {}
+    if status_code == 202:
+        headers['Location'] = body['status_url']
+    if replayed:
+        logger.info(f"Replayed role assignment response for Idempotency-Key {idempotency_key}")
+    return JSONResponse(status_code=status_code, content=body, headers=headers)
+
+async def handle_role_assignment(request: PermanentRoleAssignmentRequest, async_mode: bool):
+    if async_mode:
+        guild = get_verification_guild()
+        get_verification_member(guild, request.discord_id)
         try:
-            guild_id = int(guild_id_str)
-            logger.info(f"Parsed guild ID: {guild_id}")
-        except ValueError as e:
-            logger.error(f"Invalid DISCORD_GUILD_ID: {guild_id_str}, error: {str(e)}")
-            raise HTTPException(status_code=500, detail="DISCORD_GUILD_ID must be a valid integer")
-            
-        guild = bot_instance.get_guild(guild_id)
-        logger.info(f"Guild object: {guild}")
-        
-        if not guild:
-            logger.error(f"Discord server not found for guild ID: {guild_id}")
-            raise HTTPException(status_code=404, detail="Discord server not found")
-        
-        # Get the Discord member
-        logger.info(f"Looking for member with ID: {request.discord_id}")
-        member = guild.get_member(int(request.discord_id))
-        logger.info(f"Member object: {member}")
-        
-        if not member:
-            logger.error(f"User not found in Discord server: {request.discord_id}")
-            raise HTTPException(status_code=404, detail="User not found in Discord server")
-        
-        assigned_roles = []
-        failed_roles = []
-        
-        # Get all roles from the server that match the role IDs
-        for role_id in request.role_ids:
-            try:
-                logger.info(f"Processing role ID: {role_id}")
-                role = guild.get_role(int(role_id))
-                if not role:
-                    logger.warning(f"Role with ID {role_id} not found in server")
-                    failed_roles.append(role_id)
-                    continue
-                
-                logger.info(f"Found role: {role.name} (ID: {role.id})")
-                
-                # Check if user already has this role
-                if role in member.roles:
-                    logger.info(f"User {member.display_name} already has role {role.name}")
-                    assigned_roles.append(role.name)
-                    continue
-                
-                # Check bot permissions
-                if not guild.me.guild_permissions.manage_roles:
-                    logger.error("Bot does not have 'Manage Roles' permission")
-                    failed_roles.append(role_id)
-                    continue
-                
-                # Check role hierarchy
-                if role.position >= guild.me.top_role.position:
-                    logger.error(f"Cannot assign role {role.name} - role is higher than bot's highest role")
-                    failed_roles.append(role_id)
-                    continue
-                
-                # Assign the role
-                logger.info(f"Attempting to assign role {role.name} to {member.display_name}")
-                await member.add_roles(role, reason=f"Token verification - Wallet: {request.wallet_address}")
-                assigned_roles.append(role.name)
-                logger.info(f"Successfully assigned role {role.name} to {member.display_name}")
-                
-            except discord.Forbidden as e:
-                logger.error(f"Forbidden error when assigning role {role_id}: {str(e)}")
-                failed_roles.append(role_id)
-            except discord.HTTPException as e:
-                logger.error(f"HTTP error when assigning role {role_id}: {str(e)}")
-                failed_roles.append(role_id)
-            except ValueError as e:
-                logger.error(f"Invalid role ID {role_id}: {str(e)}")
-                failed_roles.append(role_id)
-            except Exception as e:
-                logger.error(f"Unexpected error assigning role {role_id}: {type(e).__name__}: {str(e)}")
-                failed_roles.append(role_id)
-        
-        # Remove roles that the user no longer qualifies for
-        # Get all roles from database to check which ones are token-based
-        try:
-            all_db_roles = await db.get_all_roles()
-            db_role_ids = {role.get('discordRoleId') for role in all_db_roles if role.get('discordRoleId')}
-            
-            for role in guild.roles:
-                # Check if this is a token-based role by seeing if it's in our database
-                if str(role.id) in request.role_ids:
-                    continue  # Skip roles they should have
-                
-                # Remove roles that are token-based but not in the eligible list
-                if role in member.roles and str(role.id) in db_role_ids:
-                    try:
-                        await member.remove_roles(role, reason=f"Token verification - No longer qualifies")
-                        logger.info(f"Removed role {role.name} from {member.display_name}")
-                    except Exception as e:
-                        logger.error(f"Failed to remove role {role.name}: {str(e)}")
-        except Exception as e:
-            logger.error(f"Failed to fetch roles from database for cleanup: {str(e)}")
-            # Continue without role cleanup if database fails
-        
-        success_message = f"Successfully assigned {len(assigned_roles)} roles"
-        if failed_roles:
-            success_message += f", failed to assign {len(failed_roles)} roles"
-        
-        # Send DM notification to user about role assignment
-        if assigned_roles:
-            try:
-                embed = discord.Embed(
-                    title="🎉 Roles Assigned Successfully!",
-                    description="Your Discord roles have been updated based on your token holdings.",
-                    color=0x14b8a6  # teal-500
-                )
-                
-                embed.add_field(
-                    name="✅ Assigned Roles",
-                    value="\n".join([f"• {role}" for role in assigned_roles]),
-                    inline=False
-                )
-                
-                embed.add_field(
-                    name="💰 Wallet Address",
-                    value=f"`{request.wallet_address}`",
-                    inline=False
-                )
-                
-                embed.set_footer(text="Thank you for connecting your wallet to CrowdPunk!")
-                embed.set_thumbnail(url="https://cdn.discordapp.com/emojis/1234567890123456789.png")  # Optional: Add server icon
-                
-                await member.send(embed=embed)
-                logger.info(f"Sent DM notification to {member.display_name} about role assignment")
-                
-            except discord.Forbidden:
-                logger.warning(f"Could not send DM to {member.display_name} - DMs may be disabled")
-            except Exception as e:
-                logger.error(f"Failed to send DM notification to {member.display_name}: {str(e)}")
-        
-        return RoleAssignmentResponse(
-            success=len(assigned_roles) > 0,
-            assigned_roles=assigned_roles,
-            message=success_message
+            job = role_jobs.submit(request)
+        except JobQueueFull as e:
+            logger.warning(f"Rejecting async role assignment for {request.discord_id}: {e}")
+            raise HTTPException(status_code=503, detail="Role assignment queue is full, retry later")
+        
+        logger.info(f"Queued role assignment job {job.id} for discord_id: {request.discord_id}")
+        return JSONResponse(
+            status_code=202,
+            content={'job_id': job.id, 'status': job.status, 'status_url': f"/jobs/{job.id}"},
+            headers={'Location': f"/jobs/{job.id}"}
         )
+    
+    try:
+        logger.info(f"Starting role assignment for discord_id: {request.discord_id}, wallet: {request.wallet_address}, role_ids: {request.role_ids}")
+        return await perform_role_assignment(request)
         
     except Exception as e:
         error_msg = str(e) if str(e) else "Unknown error occurred during role assignment"
         logger.error(f"Error in assign_permanent_roles: {error_msg}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {error_msg}")
 
+# Members reconciled at once across all batch requests; discord.py's HTTP client
+# enforces the per-route and global rate limits behind this shared budget
+_batch_semaphore: Optional[asyncio.Semaphore] = None
+
+def get_batch_semaphore() -> asyncio.Semaphore:
+    global _batch_semaphore
+    if _batch_semaphore is None:
+        _batch_semaphore = asyncio.Semaphore(int(os.getenv('ROLE_BATCH_CONCURRENCY', '5')))
+    return _batch_semaphore
+
+async def assign_batch_entry(guild: discord.Guild, entry: PermanentRoleAssignmentRequest, notify: bool) -> Dict[str, Any]:
+    """Reconcile one batch entry, reporting failures in the result instead of raising"""
+    async with get_batch_semaphore():
+        try:
+            member = guild.get_member(int(entry.discord_id))
+            if not member:
+                return {'discord_id': entry.discord_id, 'success': False, 'error': 'User not found in Discord server'}
+            
+            result = await reconcile_member_roles(guild, member, entry.role_ids, entry.wallet_address)
+            if notify:
+                role_notifications.notify(entry.discord_id, entry.wallet_address, result.added_roles, result.removed_roles)
+            
+            return {
+                'discord_id': entry.discord_id,
+                'success': len(result.assigned_roles) > 0,
+                'assigned_roles': result.assigned_roles,
+                'failed_roles': result.failed_roles,
+                'removed_roles': result.removed_roles
+            }
+        except Exception as e:
+            logger.error(f"Batch role assignment failed for {entry.discord_id}: {type(e).__name__}: {str(e)}")
+            return {'discord_id': entry.discord_id, 'success': False, 'error': str(e) or type(e).__name__}
+
+@app.post("/assign-permanent-roles/batch")
+async def assign_permanent_roles_batch(request: BatchRoleAssignmentRequest, _: bool = Depends(verify_api_key),
+                                       __: bool = Depends(require_bot_ready)):
+    """Assign roles for many users, streaming one NDJSON result line per user as each finishes.
+    
+    A user listed more than once gets their last entry applied and one result line.
+    """
+    max_size = int(os.getenv('ROLE_BATCH_MAX_SIZE', '1000'))
+    if len(request.assignments) > max_size:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {max_size} assignments)")
+    
+    guild = get_verification_guild()
+    
+    # Concurrent edits for one member would race and the last write would win, so only
+    # the member's last entry is applied
+    entries = list({entry.discord_id: entry for entry in request.assignments}.values())
+    if len(entries) < len(request.assignments):
+        logger.info(f"Collapsed {len(request.assignments) - len(entries)} duplicate batch entries")
+    logger.info(f"Starting batch role assignment for {len(entries)} users")
+    
+    async def stream_results():
+        tasks = [asyncio.create_task(assign_batch_entry(guild, entry, request.notify)) for entry in entries]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield json.dumps(await next_result) + "\n"
+        finally:
+            # The client went away: don't keep editing roles nobody will hear about
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.get("/jobs/{job_id}")
+async def get_role_job(job_id: str, _: bool = Depends(verify_api_key)):
+    """Status of an async role assignment, with its result once finished"""
+    job = role_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.to_dict()
+
+@app.get("/wallets/{wallet_address}/balance-history")
+async def get_balance_history(wallet_address: str, period: str = Query('day'), days: int = Query(30, ge=1),
+                              _: bool = Depends(verify_api_key)):
+    """Hourly or daily min/max/last balances for a wallet, read from the rollups"""
+    if period not in ROLLUP_PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of {', '.join(ROLLUP_PERIODS)}")
+    if not balance_history:
+        raise HTTPException(status_code=503, detail="Database not connected")
+    since = datetime.utcnow() - timedelta(days=days)
+    return {
+        "wallet_address": wallet_address,
+        "period": period,
+        "buckets": await balance_history.get_rollups(wallet_address, period, since)
+    }
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    bot_ready = bot_instance and bot_instance.is_ready()
+    bot_ready = bot_readiness.ready
     return {
-        "status": "healthy" if bot_ready else "bot_not_ready",
+        "status": "healthy" if bot_ready else ("bot_not_ready" if bot_readiness.live else "bot_stopped"),
+        "live": bot_readiness.live,
         "bot_ready": bot_ready,
-        "bot_user": str(bot_instance.user) if bot_instance and bot_instance.user else None
+        "bot_readiness": bot_readiness.stats(),
+        "bot_user": str(bot_instance.user) if bot_instance and bot_instance.user else None,
+        "mongodb_pools": mongo_clients.stats(),
+        "role_catalog": db.role_catalog.stats() if db.role_catalog else None,
+        "role_jobs": role_jobs.stats(),
+        "role_notifications": role_notifications.stats(),
+        "idempotency": idempotency_store.stats()
     }
 
 # Connect Command
@@ -0,0 +1,257 @@
+import asyncio
+import bisect
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, FrozenSet, Sequence, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import OperationFailure
+
+try:
+    import numpy as np
+except ImportError:  # in requirements.txt; without it batch lookups fall back to bisect
+    np = None
+
+logger = logging.getLogger(__name__)
+
+
+class EligibilityIndex:
+    """Role eligibility compiled from a role snapshot.
+
+    Amount thresholds are kept in one sorted array, so the amount roles a
+    balance qualifies for are always a prefix of ``amount_roles`` whose length
+    is a binary search away. Every possible outcome (no roles, or holder roles
+    plus the highest role for each prefix length) is precomputed as a frozen
+    set of Discord role ids, so resolving a balance is a lookup rather than a
+    filter and sort over the role list.
+
+    When several amount roles share a threshold, the earliest created one
+    (lowest ``_id``) is the highest role for it, as with the original scan of
+    the roles collection in insertion order.
+    """
+
+    def __init__(self, holder_roles: List[Dict[str, Any]], amount_roles: List[Dict[str, Any]]):
+        self.holder_roles = holder_roles
+        # Must be sorted by (amountThreshold, _id) ascending
+        self.amount_roles = amount_roles
+        self.thresholds: Tuple[float, ...] = tuple(float(role.get('amountThreshold', 0)) for role in amount_roles)
+        self._threshold_array = np.asarray(self.thresholds, dtype=float) if np is not None else None
+        # _highest_index[n]: the role that wins among those meeting exactly n thresholds,
+        # i.e. the first role sharing the n-th threshold
+        self._highest_index = [None] + [
+            bisect.bisect_left(self.thresholds, threshold) for threshold in self.thresholds
+        ]
+
+        holder_ids = frozenset(role['discordRoleId'] for role in holder_roles if role.get('discordRoleId'))
+        # _tier_role_ids[n]: roles for a positive balance meeting exactly n thresholds
+        self._tier_role_ids: List[FrozenSet[str]] = [holder_ids] + [
+            holder_ids | ({role['discordRoleId']} if role.get('discordRoleId') else set())
+            for role in (amount_roles[index] for index in self._highest_index[1:])
+        ]
+        self._no_roles: FrozenSet[str] = frozenset()
+
+    def tier(self, balance: float) -> int:
+        """Number of amount thresholds the balance meets, or -1 for no roles at all"""
+        if balance <= 0:
+            return -1
+        return bisect.bisect_right(self.thresholds, balance)
+
+    def tiers(self, balances: Sequence[float]):
+        """Vectorised ``tier`` for a whole batch of balances (a NumPy array when available)"""
+        if self._threshold_array is not None:
+            values = np.asarray(balances, dtype=float)
+            tiers = np.searchsorted(self._threshold_array, values, side='right')
+            tiers[values <= 0] = -1
+            return tiers
+        return [self.tier(balance) for balance in balances]
+
+    def qualifying_amount_roles(self, balance: float) -> List[Dict[str, Any]]:
+        """Amount roles whose threshold the balance meets, lowest threshold first"""
+        return self.amount_roles[:max(0, self.tier(balance))]
+
+    def highest_amount_role(self, balance: float) -> Optional[Dict[str, Any]]:
+        tier = self.tier(balance)
+        return self.amount_roles[self._highest_index[tier]] if tier > 0 else None
+
+    def roles_for_balance(self, balance: float) -> List[Dict[str, Any]]:
+        """Holder roles plus the highest qualifying amount role, for a positive balance"""
+        if balance <= 0:
+            return []
+        highest = self.highest_amount_role(balance)
+        return self.holder_roles + ([highest] if highest else [])
+
+    def role_ids_for_balance(self, balance: float) -> FrozenSet[str]:
+        tier = self.tier(balance)
+        return self._tier_role_ids[tier] if tier >= 0 else self._no_roles
+
+    def role_ids_for_balances(self, balances: Sequence[float]) -> List[FrozenSet[str]]:
+        """Eligible role ids for every balance, resolved in one vectorised pass"""
+        tier_role_ids = self._tier_role_ids + [self._no_roles]  # index -1 -> no roles
+        return [tier_role_ids[tier] for tier in self.tiers(balances)]
+
+
+@dataclass(frozen=True)
+class RoleSnapshot:
+    """Immutable view of the roles collection at one catalog version"""
+    version: int
+    roles: List[Dict[str, Any]] = field(default_factory=list)
+    holder_roles: List[Dict[str, Any]] = field(default_factory=list)
+    # Sorted by amountThreshold ascending, ties in creation (_id) order
+    amount_roles: List[Dict[str, Any]] = field(default_factory=list)
+    managed_role_ids: FrozenSet[str] = frozenset()
+    eligibility: EligibilityIndex = field(default_factory=lambda: EligibilityIndex([], []))
+    loaded_at: float = 0.0
+
+    @classmethod
+    def build(cls, version: int, roles: List[Dict[str, Any]]) -> 'RoleSnapshot':
+        holder_roles = [role for role in roles if role.get('type') == 'holder']
+        amount_roles = sorted(
+            (role for role in roles if role.get('type') == 'amount'),
+            key=lambda role: (role.get('amountThreshold', 0), str(role.get('_id', '')))
+        )
+        return cls(
+            version=version,
+            roles=roles,
+            holder_roles=holder_roles,
+            amount_roles=amount_roles,
+            managed_role_ids=frozenset(role['discordRoleId'] for role in roles if role.get('discordRoleId')),
+            eligibility=EligibilityIndex(holder_roles, amount_roles),
+            loaded_at=time.time()
+        )
+
+    def qualifying_amount_roles(self, balance: float) -> List[Dict[str, Any]]:
+        """Amount roles whose threshold the balance meets, lowest threshold first"""
+        return self.eligibility.qualifying_amount_roles(balance)
+
+    def amount_thresholds(self) -> List[float]:
+        return list(self.eligibility.thresholds)
+
+
+class RoleCatalog:
+    """In-process copy of the roles collection.
+
+    Roles change rarely but are read on almost every operation, so the whole
+    collection is loaded once and lookups are served from memory. A MongoDB
+    change stream triggers a reload whenever a role is added, edited or
+    removed; deployments without change streams (standalone servers) fall back
+    to reloading every ``poll_interval`` seconds. Each content change bumps
+    ``version``.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, poll_interval: float = 30,
+                 use_change_stream: bool = True):
+        self.collection = collection
+        self.poll_interval = poll_interval
+        self.use_change_stream = use_change_stream
+
+        self._snapshot: Optional[RoleSnapshot] = None
+        self._reload_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.mode = 'stopped'
+
+    @classmethod
+    def from_env(cls, collection: AsyncIOMotorCollection) -> 'RoleCatalog':
+        return cls(
+            collection,
+            poll_interval=float(os.getenv('ROLE_CATALOG_POLL_INTERVAL', '30')),
+            use_change_stream=os.getenv('ROLE_CATALOG_CHANGE_STREAM', 'true').lower() == 'true'
+        )
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def snapshot(self) -> RoleSnapshot:
+        """Current roles; empty until the first load succeeds"""
+        return self._snapshot or RoleSnapshot(version=0)
+
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
+
+    async def start(self):
+        """Load the catalog and keep it fresh in the background on the running loop"""
+        if self._task and not self._task.done():
+            return
+        try:
+            await self.reload()
+        except Exception as e:
+            # The background task keeps retrying; callers fall back to the database meanwhile
+            logger.error(f"Initial role catalog load failed: {e}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        self.mode = 'stopped'
+        if not task:
+            return
+        task.cancel()
+        # The task can only be awaited from the loop that owns it
+        if task.get_loop() is asyncio.get_running_loop():
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def reload(self) -> RoleSnapshot:
+        """Re-read the roles collection, bumping the version if anything changed"""
+        if self._reload_lock is None:
+            self._reload_lock = asyncio.Lock()
+
+        async with self._reload_lock:
+            roles = await self.collection.find({}).sort('_id', 1).to_list(None)
+            for role in roles:
+                role['_id'] = str(role['_id'])
+
+            current = self._snapshot
+            if current is not None and current.roles == roles:
+                return current
+
+            version = current.version + 1 if current else 1
+            self._snapshot = RoleSnapshot.build(version, roles)
+            logger.info(f"Role catalog loaded {len(roles)} roles (version {version})")
+            return self._snapshot
+
+    async def _run(self):
+        watch_supported = self.use_change_stream
+        while True:
+            if watch_supported:
+                try:
+                    await self._watch()
+                except asyncio.CancelledError:
+                    raise
+                except OperationFailure as e:
+                    logger.warning(f"Role change stream unavailable, polling every {self.poll_interval}s: {e}")
+                    watch_supported = False
+                except Exception as e:
+                    logger.warning(f"Role change stream interrupted, retrying after a poll: {e}")
+
+            self.mode = 'polling'
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to reload role catalog: {e}")
+
+    async def _watch(self):
+        async with self.collection.watch() as stream:
+            self.mode = 'change_stream'
+            # Catch anything that changed while no stream was open
+            await self.reload()
+            async for _ in stream:
+                await self.reload()
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            'version': snapshot.version,
+            'roles': len(snapshot.roles),
+            'mode': self.mode,
+            'age_seconds': round(time.time() - snapshot.loaded_at, 1) if self.loaded else None,
+        }
+
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+
+class JobQueueFull(Exception):
+    """Too many jobs are waiting; the caller should retry later"""
+
+
+@dataclass
+class RoleJob:
+    """One role assignment accepted for background processing"""
+    id: str
+    payload: Any
+    status: str = JOB_QUEUED
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class RoleJobQueue:
+    """In-process queue of role assignment jobs run by a fixed pool of workers.
+
+    Submitting only records the job and queues it, so an API request returns
+    as soon as it is validated and the caller polls ``get`` for the outcome
+    instead of waiting on Discord. Finished jobs are kept for
+    ``retention_seconds`` so late polls still see the result; ``max_pending``
+    bounds the backlog so a Discord outage can't grow it without limit.
+    """
+
+    def __init__(self, handler: Callable[[Any], Awaitable[Dict[str, Any]]], workers: int = 4,
+                 max_pending: int = 1000, retention_seconds: float = 3600):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+
+        self._jobs: Dict[str, RoleJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+        self.succeeded = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the worker tasks on the running event loop"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10):
+        """Finish queued jobs for up to ``timeout`` seconds, then stop the workers"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping role job queue with {self._queue.qsize()} jobs still queued")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, payload: Any) -> RoleJob:
+        if self._queue is None:
+            raise RuntimeError("Role job queue is not started")
+        self._prune()
+        if self._queue.qsize() >= self.max_pending:
+            raise JobQueueFull(f"{self._queue.qsize()} role jobs already queued")
+
+        job = RoleJob(id=uuid.uuid4().hex, payload=payload)
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[RoleJob]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = await self.handler(job.payload)
+                job.status = JOB_SUCCEEDED
+                self.succeeded += 1
+            except asyncio.CancelledError:
+                job.error = 'cancelled'
+                job.status = JOB_FAILED
+                raise
+            except Exception as e:
+                job.error = str(e) or type(e).__name__
+                job.status = JOB_FAILED
+                self.failed += 1
+                logger.error(f"Role job {job.id} failed: {job.error}")
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'queued': self._queue.qsize() if self._queue else 0,
+            'running': sum(1 for job in self._jobs.values() if job.status == JOB_RUNNING),
+            'retained': len(self._jobs),
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+        }
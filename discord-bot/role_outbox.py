@@ -0,0 +1,163 @@
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_DONE = 'done'
+STATUS_DEAD = 'dead'
+
+
+class RetryableRoleSyncError(Exception):
+    """A role sync failed in a way that is worth retrying later (Discord outage, rate limit, ...)"""
+
+
+class PermanentRoleSyncError(Exception):
+    """A role sync was rejected in a way retrying can't fix (missing permission, unknown role, ...)"""
+
+
+def role_sync_error(status: Optional[int], message: str) -> Exception:
+    """Classify a failed Discord response: network errors, 429s and 5xx are retryable, other 4xx are not"""
+    if status is None or status == 429 or status >= 500:
+        return RetryableRoleSyncError(message)
+    return PermanentRoleSyncError(message)
+
+
+class RoleSyncOutbox:
+    """Durable queue of role-sync jobs in MongoDB.
+
+    There is one job document per Discord user (``_id`` is the discordId), so
+    enqueueing a newer balance replaces an older one that has not run yet.
+    Workers claim jobs with a lease; a crashed worker's leases expire and the
+    jobs are claimed again. Failures are retried with capped exponential
+    backoff, and each enqueue bumps ``generation`` so a worker finishing an
+    older generation never marks a newer one done. Role syncs are idempotent,
+    which makes the at-least-once delivery safe.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, collection_name: str = 'role_sync_outbox',
+                 lease_seconds: float = 120, base_backoff: float = 5, max_backoff: float = 3600,
+                 done_retention_days: int = 7):
+        self.collection = db[collection_name]
+        self.lease_seconds = lease_seconds
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.done_retention_seconds = int(done_retention_days * 86400)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+    @classmethod
+    def from_env(cls, db: AsyncIOMotorDatabase) -> 'RoleSyncOutbox':
+        return cls(
+            db,
+            collection_name=os.getenv('ROLE_OUTBOX_COLLECTION', 'role_sync_outbox'),
+            lease_seconds=float(os.getenv('ROLE_OUTBOX_LEASE_SECONDS', '120')),
+            base_backoff=float(os.getenv('ROLE_OUTBOX_BASE_BACKOFF', '5')),
+            max_backoff=float(os.getenv('ROLE_OUTBOX_MAX_BACKOFF', '3600')),
+            done_retention_days=int(os.getenv('ROLE_OUTBOX_DONE_RETENTION_DAYS', '7'))
+        )
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([('status', ASCENDING), ('availableAt', ASCENDING)])
+        # Finished jobs clean themselves up; pending ones have no completedAt
+        await self.collection.create_index('completedAt', expireAfterSeconds=self.done_retention_seconds)
+
+    async def enqueue(self, balance_updates: List[Dict[str, Any]]) -> int:
+        """Record that these users' roles must be brought in line with their new balances"""
+        if not balance_updates:
+            return 0
+
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {'_id': str(update['discordId'])},
+                {
+                    '$set': {
+                        'walletAddress': update['walletAddress'],
+                        'currentBalance': update['currentBalance'],
+                        'status': STATUS_PENDING,
+                        'availableAt': now,
+                        'attempts': 0,
+                        'lastError': None,
+                        'updatedAt': now
+                    },
+                    # Leave any live lease alone so the user's job never runs twice at once
+                    '$unset': {'completedAt': ''},
+                    '$inc': {'generation': 1},
+                    '$setOnInsert': {'createdAt': now}
+                },
+                upsert=True
+            )
+            for update in balance_updates
+        ]
+        result = await self.collection.bulk_write(operations, ordered=False)
+        return result.upserted_count + result.matched_count
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        """Lease the next due job, or return None when nothing is due"""
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {
+                'status': STATUS_PENDING,
+                'availableAt': {'$lte': now},
+                '$or': [{'leaseExpiresAt': None}, {'leaseExpiresAt': {'$lte': now}}]
+            },
+            {'$set': {
+                'leaseOwner': self.owner,
+                'leaseExpiresAt': now + timedelta(seconds=self.lease_seconds)
+            }},
+            sort=[('availableAt', ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def complete(self, job: Dict[str, Any]):
+        """Mark the claimed generation done, or just release it if a newer one was enqueued"""
+        now = datetime.utcnow()
+        release = {'leaseOwner': None, 'leaseExpiresAt': None}
+        result = await self.collection.update_one(
+            {'_id': job['_id'], 'leaseOwner': self.owner, 'generation': job['generation']},
+            {'$set': {**release, 'status': STATUS_DONE, 'completedAt': now, 'updatedAt': now}}
+        )
+        if not result.matched_count:
+            await self.collection.update_one({'_id': job['_id'], 'leaseOwner': self.owner}, {'$set': release})
+
+    async def fail(self, job: Dict[str, Any], error: str, retryable: bool = True):
+        """Release the job for a backed-off retry, or park it when retrying can't help"""
+        now = datetime.utcnow()
+        attempts = job.get('attempts', 0) + 1
+        update: Dict[str, Any] = {
+            'leaseOwner': None,
+            'leaseExpiresAt': None,
+            'attempts': attempts,
+            'lastError': error,
+            'updatedAt': now
+        }
+        if retryable:
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+            update['availableAt'] = now + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+        else:
+            update['status'] = STATUS_DEAD
+
+        result = await self.collection.update_one(
+            {'_id': job['_id'], 'leaseOwner': self.owner, 'generation': job['generation']},
+            {'$set': update}
+        )
+        if not result.matched_count:
+            # A newer balance arrived meanwhile; it starts with a fresh attempt count
+            await self.collection.update_one(
+                {'_id': job['_id'], 'leaseOwner': self.owner},
+                {'$set': {'leaseOwner': None, 'leaseExpiresAt': None}}
+            )
+
+    async def stats(self) -> Dict[str, int]:
+        counts = {STATUS_PENDING: 0, STATUS_DONE: 0, STATUS_DEAD: 0}
+        async for row in self.collection.aggregate([{'$group': {'_id': '$status', 'count': {'$sum': 1}}}]):
+            counts[row['_id']] = row['count']
+        return counts
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class RoleUpdateWorker:
+    """Long-lived queue of pending role updates, coalesced per Discord user.
+
+    Only the latest update for a user is kept: a newer one replaces a pending
+    older one, and a user whose update is in flight is re-queued afterwards
+    rather than processed concurrently, so updates for one user never run out
+    of order. A fixed number of worker tasks bounds how many users are updated
+    at once.
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Awaitable[None]], concurrency: int = 4):
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._in_flight: Set[str] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+        self.processed = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the worker tasks on the running event loop"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    def submit(self, key: str, update: Dict[str, Any]):
+        """Queue ``update`` for ``key``, replacing any update still waiting for it"""
+        if key in self._pending:
+            self._pending[key] = update
+            self.coalesced += 1
+            return
+
+        self._pending[key] = update
+        # An in-flight key is re-queued when it finishes
+        if key not in self._in_flight:
+            self._queue.put_nowait(key)
+
+    async def _run(self):
+        while True:
+            key = await self._queue.get()
+            update = self._pending.pop(key, None)
+            if update is None:
+                self._queue.task_done()
+                continue
+
+            self._in_flight.add(key)
+            try:
+                await self.handler(update)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Role update for {key} failed: {e}")
+            finally:
+                self._in_flight.discard(key)
+                if key in self._pending:
+                    self._queue.put_nowait(key)
+                self._queue.task_done()
+
+    async def stop(self, timeout: float = 10):
+        """Finish queued updates for up to ``timeout`` seconds, then stop the workers"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping role update worker with {len(self._pending)} updates still pending")
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    @property
+    def backlog(self) -> int:
+        """Updates queued or running"""
+        return len(self._pending) + len(self._in_flight)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pending': len(self._pending),
+            'in_flight': len(self._in_flight),
+            'processed': self.processed,
+            'coalesced': self.coalesced,
+            'failed': self.failed,
+        }
@@ -0,0 +1,285 @@
+import asyncio
+import base64
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Tuple, Iterator
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+ALL_BALANCES_PATH = '/cosmos.bank.v1beta1.Query/AllBalances'
+BALANCE_PATH = '/cosmos.bank.v1beta1.Query/Balance'
+
+# Page size used only when listing every denom of a wallet
+ALL_BALANCES_PAGE_LIMIT = 200
+
+# (denom, amount) pairs as returned by the bank module
+Coins = List[Tuple[str, str]]
+
+
+# Minimal protobuf wire-format helpers - the bank queries only need
+# varints and length-delimited fields, so we avoid a protobuf dependency.
+
+def _encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _decode_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(buf):
+            raise ValueError("Truncated varint")
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _encode_bytes_field(field_number: int, value: bytes) -> bytes:
+    return _encode_varint((field_number << 3) | 2) + _encode_varint(len(value)) + value
+
+
+def _iter_fields(buf: bytes) -> Iterator[Tuple[int, int, object]]:
+    """Yield (field_number, wire_type, value) for each field in a message"""
+    pos = 0
+    while pos < len(buf):
+        key, pos = _decode_varint(buf, pos)
+        field_number, wire_type = key >> 3, key & 0x07
+        if wire_type == 0:
+            value, pos = _decode_varint(buf, pos)
+        elif wire_type == 2:
+            length, pos = _decode_varint(buf, pos)
+            value = buf[pos:pos + length]
+            pos += length
+        elif wire_type == 1:
+            value = buf[pos:pos + 8]
+            pos += 8
+        elif wire_type == 5:
+            value = buf[pos:pos + 4]
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type}")
+        yield field_number, wire_type, value
+
+
+def _encode_varint_field(field_number: int, value: int) -> bytes:
+    return _encode_varint(field_number << 3) + _encode_varint(value)
+
+
+def encode_balance_request(address: str, denom: str) -> bytes:
+    """QueryBalanceRequest{address = 1, denom = 2}"""
+    return _encode_bytes_field(1, address.encode()) + _encode_bytes_field(2, denom.encode())
+
+
+def encode_all_balances_request(address: str, page_key: bytes = b'') -> bytes:
+    """QueryAllBalancesRequest{address = 1, PageRequest pagination = 2}"""
+    page_request = _encode_varint_field(3, ALL_BALANCES_PAGE_LIMIT)
+    if page_key:
+        page_request = _encode_bytes_field(1, page_key) + page_request
+    return _encode_bytes_field(1, address.encode()) + _encode_bytes_field(2, page_request)
+
+
+def decode_coin(buf: bytes) -> Tuple[str, str]:
+    """Coin{denom = 1, amount = 2}"""
+    denom, amount = '', '0'
+    for field_number, _, value in _iter_fields(buf):
+        if field_number == 1:
+            denom = value.decode()
+        elif field_number == 2:
+            amount = value.decode()
+    return denom, amount
+
+
+def decode_balance_response(buf: bytes) -> Optional[Tuple[str, str]]:
+    """QueryBalanceResponse{Coin balance = 1}"""
+    for field_number, _, value in _iter_fields(buf):
+        if field_number == 1:
+            return decode_coin(value)
+    return None
+
+
+def decode_all_balances_response(buf: bytes) -> Tuple[Coins, bytes]:
+    """QueryAllBalancesResponse{repeated Coin balances = 1, PageResponse pagination = 2}
+
+    Returns the coins on this page and the next page key (empty on the last page).
+    """
+    coins: Coins = []
+    next_key = b''
+    for field_number, _, value in _iter_fields(buf):
+        if field_number == 1:
+            coins.append(decode_coin(value))
+        elif field_number == 2:
+            for page_field, _, page_value in _iter_fields(value):
+                if page_field == 1:
+                    next_key = page_value
+    return coins, next_key
+
+
+@dataclass
+class RPCBatchResponse:
+    """Outcome of one JSON-RPC batch call"""
+    status: Optional[int]  # None when no HTTP response was received
+    balances: Dict[str, Optional[Coins]] = field(default_factory=dict)
+    headers: Dict[str, str] = field(default_factory=dict)
+    timed_out: bool = False
+
+    @property
+    def overloaded(self) -> bool:
+        return self.timed_out or self.status is None or self.status == 429 or self.status >= 500
+
+
+class TendermintRPCBalanceClient:
+    """Bank balance lookups packed into Tendermint JSON-RPC abci_query batches"""
+
+    def __init__(self, rpc_url: str, batch_size: int = 50):
+        self.rpc_url = rpc_url.rstrip('/')
+        self.batch_size = max(1, batch_size)
+
+    @classmethod
+    def from_env(cls) -> 'TendermintRPCBalanceClient':
+        return cls(
+            os.getenv('OSMOSIS_RPC_URL', 'https://rpc.testnet.osmosis.zone'),
+            batch_size=int(os.getenv('RPC_BATCH_SIZE', '50'))
+        )
+
+    @staticmethod
+    def _build_call(request_id: int, path: str, data: bytes) -> Dict[str, object]:
+        return {
+            'jsonrpc': '2.0',
+            'id': request_id,
+            'method': 'abci_query',
+            'params': {'path': path, 'data': data.hex(), 'height': '0', 'prove': False}
+        }
+
+    async def _post_batch(self, session: aiohttp.ClientSession, calls: List[Dict[str, object]],
+                          timeout: Optional[aiohttp.ClientTimeout]) -> Tuple[RPCBatchResponse, Dict[int, bytes]]:
+        """POST one JSON-RPC batch and return the decoded abci values keyed by call id"""
+        try:
+            async with session.post(self.rpc_url, json=calls, timeout=timeout) as response:
+                if response.status != 200:
+                    return RPCBatchResponse(response.status, headers=dict(response.headers)), {}
+                results = await response.json(content_type=None)
+                headers = dict(response.headers)
+        except asyncio.TimeoutError:
+            return RPCBatchResponse(None, timed_out=True), {}
+        except aiohttp.ClientError as e:
+            logger.warning(f"RPC batch request to {self.rpc_url} failed: {e}")
+            return RPCBatchResponse(None), {}
+
+        # A single error object means the node rejected the whole batch
+        if isinstance(results, dict):
+            logger.warning(f"RPC batch rejected by {self.rpc_url}: {results.get('error')}")
+            return RPCBatchResponse(500, headers=headers), {}
+
+        values: Dict[int, bytes] = {}
+        for item in results:
+            # Batch responses are not guaranteed to come back in request order
+            request_id = item.get('id')
+            if not isinstance(request_id, int) or not 0 <= request_id < len(calls):
+                continue
+
+            abci_response = (item.get('result') or {}).get('response') or {}
+            if item.get('error') or abci_response.get('code', 0) != 0:
+                logger.warning(f"abci_query {request_id} failed: {item.get('error') or abci_response.get('log')}")
+                continue
+
+            try:
+                values[request_id] = base64.b64decode(abci_response.get('value') or '')
+            except ValueError as e:
+                logger.error(f"Failed to decode abci_query {request_id} value: {e}")
+
+        return RPCBatchResponse(200, headers=headers), values
+
+    async def query_balances(self, session: aiohttp.ClientSession, addresses: List[str],
+                             denoms: Optional[List[str]] = None,
+                             timeout: Optional[aiohttp.ClientTimeout] = None) -> RPCBatchResponse:
+        """Fetch balances for many addresses in one HTTP round trip.
+
+        With ``denoms`` only those denoms are queried; otherwise every balance is
+        listed, following pagination only for wallets that have more pages.
+        """
+        # A repeated address would be queried (and its coins counted) twice
+        addresses = list(dict.fromkeys(addresses))
+        if denoms:
+            return await self._query_denom_balances(session, addresses, denoms, timeout)
+        return await self._query_all_balances(session, addresses, timeout)
+
+    async def _query_denom_balances(self, session: aiohttp.ClientSession, addresses: List[str],
+                                    denoms: List[str], timeout: Optional[aiohttp.ClientTimeout]) -> RPCBatchResponse:
+        pairs = [(address, denom) for address in addresses for denom in denoms]
+        calls = [
+            self._build_call(request_id, BALANCE_PATH, encode_balance_request(address, denom))
+            for request_id, (address, denom) in enumerate(pairs)
+        ]
+
+        response, values = await self._post_batch(session, calls, timeout)
+        if response.status != 200:
+            return response
+
+        balances: Dict[str, Optional[Coins]] = {address: [] for address in addresses}
+        for request_id, (address, denom) in enumerate(pairs):
+            if balances[address] is None:
+                continue
+            if request_id not in values:
+                # Any failed denom makes the wallet's total unknown
+                balances[address] = None
+                continue
+            try:
+                coin = decode_balance_response(values[request_id])
+            except ValueError as e:
+                logger.error(f"Failed to decode {denom} balance for {address}: {e}")
+                balances[address] = None
+                continue
+            if coin:
+                balances[address].append(coin)
+
+        response.balances = balances
+        return response
+
+    async def _query_all_balances(self, session: aiohttp.ClientSession, addresses: List[str],
+                                  timeout: Optional[aiohttp.ClientTimeout]) -> RPCBatchResponse:
+        balances: Dict[str, Optional[Coins]] = {address: [] for address in addresses}
+        page_keys: Dict[str, bytes] = {address: b'' for address in addresses}
+        response = RPCBatchResponse(200)
+
+        while page_keys:
+            pending = list(page_keys)
+            calls = [
+                self._build_call(request_id, ALL_BALANCES_PATH, encode_all_balances_request(address, page_keys[address]))
+                for request_id, address in enumerate(pending)
+            ]
+
+            response, values = await self._post_batch(session, calls, timeout)
+            if response.status != 200:
+                return response
+
+            page_keys = {}
+            for request_id, address in enumerate(pending):
+                if request_id not in values:
+                    balances[address] = None
+                    continue
+                try:
+                    coins, next_key = decode_all_balances_response(values[request_id])
+                except ValueError as e:
+                    logger.error(f"Failed to decode balances for {address}: {e}")
+                    balances[address] = None
+                    continue
+                balances[address].extend(coins)
+                if next_key:
+                    page_keys[address] = next_key
+
+        response.balances = balances
+        return response
@@ -0,0 +1,149 @@
+import hashlib
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Set
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(wallet_address: str, shard_count: int) -> int:
+    """Stable shard number for a wallet address"""
+    digest = hashlib.sha1(wallet_address.encode()).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+
+def _rendezvous_weight(worker_id: str, shard: int) -> int:
+    digest = hashlib.sha1(f"{worker_id}:{shard}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+class ShardCoordinator:
+    """Splits the wallet space across monitor processes using MongoDB leases.
+
+    Wallets hash onto a fixed number of shards. Live workers heartbeat into
+    ``monitor_workers``; each shard's preferred owner is picked by rendezvous
+    hashing over the live workers, and ownership is only taken through an
+    atomic lease in ``monitor_shard_leases``, so a shard never has two owners.
+    When a worker stops heartbeating its leases expire and the survivors pick
+    them up on their next refresh.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, shard_count: int = 64, lease_ttl: float = 30):
+        self.shard_count = max(1, shard_count)
+        self.lease_ttl = lease_ttl
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+        self.workers_collection = db['monitor_workers']
+        self.leases_collection = db['monitor_shard_leases']
+
+        # shard -> local monotonic time our lease is safe until
+        self._owned: Dict[int, float] = {}
+        self.ownership_changed = False
+        self._indexes_ready = False
+
+    @classmethod
+    def from_env(cls, db: AsyncIOMotorDatabase) -> 'ShardCoordinator':
+        return cls(
+            db,
+            shard_count=int(os.getenv('MONITOR_SHARD_COUNT', '64')),
+            lease_ttl=float(os.getenv('MONITOR_LEASE_TTL', '30'))
+        )
+
+    async def _ensure_indexes(self):
+        if self._indexes_ready:
+            return
+        # Dead workers disappear on their own once their heartbeat lapses
+        await self.workers_collection.create_index('expiresAt', expireAfterSeconds=0)
+        self._indexes_ready = True
+
+    async def _live_workers(self, now: datetime) -> List[str]:
+        workers = self.workers_collection.find({'expiresAt': {'$gt': now}}, {'_id': 1})
+        return [worker['_id'] async for worker in workers]
+
+    def _preferred_owner(self, shard: int, workers: List[str]) -> str:
+        return max(workers, key=lambda worker_id: _rendezvous_weight(worker_id, shard))
+
+    async def refresh(self):
+        """Heartbeat, then acquire/renew the shards we should own and release the rest"""
+        await self._ensure_indexes()
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.lease_ttl)
+        # Treat leases as lost a little before they really expire to absorb clock skew
+        safe_until = time.monotonic() + self.lease_ttl * 0.8
+
+        await self.workers_collection.update_one(
+            {'_id': self.worker_id},
+            {'$set': {'lastSeen': now, 'expiresAt': expires_at}},
+            upsert=True
+        )
+
+        workers = await self._live_workers(now)
+        if self.worker_id not in workers:
+            workers.append(self.worker_id)
+
+        previous = set(self._owned)
+        owned: Dict[int, float] = {}
+
+        for shard in range(self.shard_count):
+            if self._preferred_owner(shard, workers) == self.worker_id:
+                if await self._acquire(shard, now, expires_at):
+                    owned[shard] = safe_until
+            elif shard in previous:
+                await self._release(shard)
+
+        self._owned = owned
+        if set(owned) - previous:
+            self.ownership_changed = True
+        if set(owned) != previous:
+            logger.info(f"Worker {self.worker_id} owns {len(owned)}/{self.shard_count} shards ({len(workers)} live workers)")
+
+    async def _acquire(self, shard: int, now: datetime, expires_at: datetime) -> bool:
+        """Take or renew a shard lease if it is free, expired or already ours"""
+        try:
+            lease = await self.leases_collection.find_one_and_update(
+                {
+                    '_id': shard,
+                    '$or': [
+                        {'owner': self.worker_id},
+                        {'owner': None},
+                        {'expiresAt': {'$lte': now}}
+                    ]
+                },
+                {'$set': {'owner': self.worker_id, 'expiresAt': expires_at}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            return lease is not None and lease.get('owner') == self.worker_id
+        except DuplicateKeyError:
+            # Another live worker still holds the lease; it will release it on its next refresh
+            return False
+
+    async def _release(self, shard: int):
+        await self.leases_collection.update_one(
+            {'_id': shard, 'owner': self.worker_id},
+            {'$set': {'owner': None, 'expiresAt': datetime.utcnow()}}
+        )
+
+    async def release_all(self):
+        """Give up every lease so other workers can take over immediately"""
+        for shard in list(self._owned):
+            await self._release(shard)
+        self._owned = {}
+        await self.workers_collection.delete_one({'_id': self.worker_id})
+
+    def owned_shards(self) -> Set[int]:
+        now = time.monotonic()
+        return {shard for shard, safe_until in self._owned.items() if safe_until > now}
+
+    def owns(self, wallet_address: str) -> bool:
+        """Whether this worker currently holds the lease covering the wallet"""
+        safe_until = self._owned.get(shard_for(wallet_address, self.shard_count))
+        return safe_until is not None and safe_until > time.monotonic()
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import mongomock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class AsyncCollection:
+    """Just enough of motor's collection API over a mongomock collection"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+class AsyncDatabase:
+    def __init__(self):
+        self._db = mongomock.MongoClient().db
+
+    def __getitem__(self, name):
+        return AsyncCollection(self._db[name])
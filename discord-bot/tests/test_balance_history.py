@@ -0,0 +1,238 @@
+import asyncio
+import socket
+import socketserver
+import struct
+import threading
+from datetime import datetime, timedelta
+
+import bson
+from bson import ObjectId
+from bson.int64 import Int64
+from mongomock.filtering import filter_applies
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from balance_history import BalanceHistoryStore
+
+OP_REPLY = 1
+OP_QUERY = 2004
+OP_MSG = 2013
+
+
+class StubMongo:
+    """A standalone mongod answering just the commands BalanceHistoryStore sends"""
+
+    def __init__(self, collections=None, documents=None):
+        self.collections = dict(collections or {})
+        self.documents = {name: list(docs) for name, docs in (documents or {}).items()}
+        self.commands = []
+        self._server = None
+
+    def start(self) -> str:
+        stub = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                stub._serve(self.request)
+
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"mongodb://127.0.0.1:{self._server.server_address[1]}/?directConnection=true"
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _serve(self, sock: socket.socket):
+        stream = sock.makefile('rb')
+        while True:
+            header = stream.read(16)
+            if len(header) < 16:
+                return
+            length, request_id, _, op_code = struct.unpack('<iiii', header)
+            body = stream.read(length - 16)
+            if op_code == OP_QUERY:
+                # Legacy handshake: flags, cstring namespace, skip, limit, query
+                namespace_end = body.index(b'\0', 4)
+                query = body[namespace_end + 9:]
+                command = bson.decode(query[:struct.unpack('<i', query[:4])[0]])
+                payload = struct.pack('<iqii', 0, 0, 0, 1) + bson.encode(self._handle(command))
+                sock.sendall(struct.pack('<iiii', 16 + len(payload), 0, request_id, OP_REPLY) + payload)
+            else:
+                payload = struct.pack('<iB', 0, 0) + bson.encode(self._handle(self._decode_msg(body)))
+                sock.sendall(struct.pack('<iiii', 16 + len(payload), 0, request_id, OP_MSG) + payload)
+
+    @staticmethod
+    def _decode_msg(body: bytes) -> dict:
+        command, position = {}, 4
+        while position < len(body):
+            kind = body[position]
+            position += 1
+            size = struct.unpack('<i', body[position:position + 4])[0]
+            if kind == 0:
+                command.update(bson.decode(body[position:position + size]))
+            else:
+                identifier_end = body.index(b'\0', position + 4)
+                identifier = body[position + 4:identifier_end].decode()
+                documents = bson.decode_all(body[identifier_end + 1:position + size])
+                command[identifier] = documents
+            position += size
+        return command
+
+    def _handle(self, command: dict) -> dict:
+        name = next(iter(command))
+        if name.lower() in ('hello', 'ismaster'):
+            return {
+                'ok': 1, 'isWritablePrimary': True, 'ismaster': True, 'helloOk': True,
+                'minWireVersion': 0, 'maxWireVersion': 17, 'maxBsonObjectSize': 16 * 1024 * 1024,
+                'maxMessageSizeBytes': 48000000, 'maxWriteBatchSize': 100000,
+                'localTime': datetime.utcnow(), 'logicalSessionTimeoutMinutes': 30, 'connectionId': 1
+            }
+
+        self.commands.append(command)
+        if name == 'listCollections':
+            wanted = command.get('filter', {}).get('name')
+            batch = [{'name': collection_name, **info} for collection_name, info in self.collections.items()
+                     if wanted in (None, collection_name)]
+            return {'ok': 1, 'cursor': {'id': Int64(0), 'ns': f"{command['$db']}.$cmd.listCollections",
+                                        'firstBatch': batch}}
+        if name == 'create':
+            options = {key: command[key] for key in ('timeseries', 'expireAfterSeconds') if key in command}
+            self.collections[command['create']] = {'type': 'timeseries' if 'timeseries' in command else 'collection',
+                                                   'options': options}
+        if name == 'collMod':
+            self.collections[command['collMod']]['options']['expireAfterSeconds'] = command['expireAfterSeconds']
+        if name == 'renameCollection':
+            source, target = command['renameCollection'].split('.', 1)[1], command['to'].split('.', 1)[1]
+            self.collections[target] = self.collections.pop(source)
+            self.documents[target] = self.documents.pop(source, [])
+        if name == 'insert':
+            self.documents.setdefault(command['insert'], []).extend(command['documents'])
+            return {'ok': 1, 'n': len(command['documents'])}
+        if name == 'distinct':
+            values = {doc[command['key']] for doc in self._matching(command['distinct'], command.get('query'))}
+            return {'ok': 1, 'values': list(values)}
+        if name == 'find':
+            documents = self._matching(command['find'], command.get('filter'))
+            for key, direction in reversed(list(command.get('sort', {}).items())):
+                documents.sort(key=lambda doc: doc[key], reverse=direction < 0)
+            if command.get('limit'):
+                documents = documents[:command['limit']]
+            if command.get('projection') == {'_id': 0}:
+                documents = [{key: value for key, value in doc.items() if key != '_id'} for doc in documents]
+            return {'ok': 1, 'cursor': {'id': Int64(0), 'ns': f"{command['$db']}.{command['find']}",
+                                        'firstBatch': documents}}
+        return {'ok': 1}
+
+    def _matching(self, collection_name: str, query) -> list:
+        return [doc for doc in self.documents.get(collection_name, []) if filter_applies(query or {}, doc)]
+
+    def sent(self, name: str) -> list:
+        return [command for command in self.commands if next(iter(command)) == name]
+
+
+def run_store(stub: StubMongo, action, **kwargs):
+    async def scenario():
+        client = AsyncIOMotorClient(uri, serverSelectionTimeoutMS=2000)
+        try:
+            return await action(BalanceHistoryStore(client['interchain'], retention_days=90, **kwargs))
+        finally:
+            client.close()
+
+    uri = stub.start()
+    try:
+        return asyncio.run(scenario())
+    finally:
+        stub.stop()
+
+
+def ensure_collections(stub: StubMongo, **kwargs) -> StubMongo:
+    run_store(stub, lambda store: store.ensure_collections(), **kwargs)
+    return stub
+
+
+def test_creates_time_series_collection_with_retention():
+    stub = ensure_collections(StubMongo())
+
+    created = stub.sent('create')
+    assert len(created) == 1
+    assert created[0]['create'] == 'balance_history'
+    assert created[0]['timeseries']['timeField'] == 'timestamp'
+    assert created[0]['expireAfterSeconds'] == 90 * 86400
+    rollup_indexes = [index for command in stub.sent('createIndexes') for index in command['indexes']]
+    assert [index['key'] for index in rollup_indexes] == [
+        {'walletAddress': 1, 'period': 1, 'bucketStart': 1},
+        {'bucketStart': 1},
+    ]
+
+
+def test_updates_retention_of_existing_time_series_collection():
+    stub = ensure_collections(StubMongo({
+        'balance_history': {'type': 'timeseries', 'options': {'expireAfterSeconds': 30 * 86400}}
+    }))
+
+    assert not stub.sent('create')
+    assert stub.sent('collMod')[0]['expireAfterSeconds'] == 90 * 86400
+
+
+def test_legacy_collection_keeps_history_without_opt_in():
+    stub = ensure_collections(StubMongo({'balance_history': {'type': 'collection', 'options': {}}}))
+
+    assert not stub.sent('create')
+    assert not stub.sent('collMod')
+    history_indexes = [index for command in stub.sent('createIndexes')
+                       if command['createIndexes'] == 'balance_history' for index in command['indexes']]
+    assert [index['key'] for index in history_indexes] == [{'walletAddress': 1, 'timestamp': 1}]
+
+
+def history(count, start):
+    return [{'_id': ObjectId(), 'walletAddress': 'osmo1', 'currentBalance': float(i),
+             'timestamp': start + timedelta(minutes=i)} for i in range(count)]
+
+
+def test_migrates_legacy_collection_into_time_series():
+    now = datetime.utcnow().replace(microsecond=0)
+    expired = history(2, now - timedelta(days=200))
+    recent = history(3, now - timedelta(days=1))
+    stub = ensure_collections(
+        StubMongo({'balance_history': {'type': 'collection', 'options': {}}}, {'balance_history': expired + recent}),
+        migrate_legacy=True
+    )
+
+    assert stub.sent('renameCollection')[0]['to'] == 'interchain.balance_history_legacy'
+    assert stub.collections['balance_history']['type'] == 'timeseries'
+    assert len(stub.documents['balance_history_legacy']) == 5
+    # Only history inside the retention period is copied, oldest first
+    assert [doc['_id'] for doc in stub.documents['balance_history']] == [doc['_id'] for doc in recent]
+
+
+def test_interrupted_migration_resumes_without_duplicates():
+    now = datetime.utcnow().replace(microsecond=0)
+    legacy = history(4, now - timedelta(days=1))
+    stub = ensure_collections(
+        StubMongo(
+            {'balance_history': {'type': 'timeseries', 'options': {'expireAfterSeconds': 90 * 86400}},
+             'balance_history_legacy': {'type': 'collection', 'options': {}}},
+            {'balance_history': legacy[:2], 'balance_history_legacy': legacy}
+        ),
+        migrate_legacy=True
+    )
+
+    assert not stub.sent('renameCollection')
+    assert [doc['_id'] for doc in stub.documents['balance_history']] == [doc['_id'] for doc in legacy]
+
+
+def test_get_rollups_reads_buckets_in_order():
+    day = datetime(2026, 10, 1)
+    rollups = [
+        {'_id': ObjectId(), 'walletAddress': 'osmo1', 'period': 'day', 'bucketStart': day + timedelta(days=offset),
+         'min': 1.0, 'max': 2.0, 'last': 2.0, 'changes': 3}
+        for offset in (2, 0, 1)
+    ] + [{'_id': ObjectId(), 'walletAddress': 'osmo2', 'period': 'day', 'bucketStart': day,
+          'min': 5.0, 'max': 5.0, 'last': 5.0, 'changes': 1}]
+    stub = StubMongo(documents={'balance_history_rollups': rollups})
+
+    buckets = run_store(stub, lambda store: store.get_rollups('osmo1', 'day', since=day + timedelta(days=1)))
+
+    assert [bucket['bucketStart'] for bucket in buckets] == [day + timedelta(days=1), day + timedelta(days=2)]
+    assert '_id' not in buckets[0]
@@ -0,0 +1,28 @@
+import asyncio
+
+from bot_readiness import BotReadiness
+
+
+class FakeBot:
+    def is_closed(self):
+        return False
+
+    def get_guild(self, guild_id):
+        return None
+
+
+def test_ready_event_is_created_on_the_loop_that_uses_it():
+    # Built at import time in the servers, before any event loop is running
+    readiness = BotReadiness(FakeBot())
+    assert readiness._ready is None
+    assert not readiness.ready
+
+    async def scenario():
+        readiness._started_at = 0.0
+        waiter = asyncio.create_task(readiness.wait(1))
+        await asyncio.sleep(0)
+        await readiness._on_ready()
+        return await waiter
+
+    assert asyncio.run(scenario())
+    assert readiness.ready
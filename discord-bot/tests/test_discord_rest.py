@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+from aiohttp import web
+
+from discord_rest import DiscordRESTClient
+
+
+async def serve(routes):
+    app = web.Application()
+    app.router.add_routes(routes)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_exhausted_bucket_waits_for_its_reset():
+    async def scenario():
+        async def member(request):
+            return web.json_response({'user': {'id': request.match_info['user_id']}}, headers={
+                'X-RateLimit-Bucket': 'members',
+                'X-RateLimit-Remaining': '0',
+                'X-RateLimit-Reset-After': '0.3',
+            })
+
+        runner, url = await serve([web.get('/guilds/{guild_id}/members/{user_id}', member)])
+        client = DiscordRESTClient('token', api_base=url)
+        try:
+            first = await client.get_member('1', '10')
+            started = time.monotonic()
+            second = await client.get_member('1', '11')
+            return client, first, second, time.monotonic() - started
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    client, first, second, elapsed = asyncio.run(scenario())
+    assert first.ok and second.ok
+    assert client._route_buckets['GET /guilds/{guild_id}/members/{user_id}'] == 'members'
+    # The second request was held until the reset instead of drawing a 429
+    assert elapsed >= 0.25
+    assert client.throttled_seconds >= 0.25
+    assert client.rate_limited == 0
+
+
+def test_429_is_retried_after_retry_after():
+    async def scenario():
+        calls = []
+
+        async def member(request):
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                return web.json_response({'message': 'You are being rate limited.', 'retry_after': 0.2,
+                                          'global': False}, status=429)
+            return web.json_response({'user': {'id': '10'}})
+
+        runner, url = await serve([web.get('/guilds/{guild_id}/members/{user_id}', member)])
+        client = DiscordRESTClient('token', api_base=url)
+        try:
+            response = await client.get_member('1', '10')
+            return client, response, calls
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    client, response, calls = asyncio.run(scenario())
+    assert response.status == 200
+    assert response.data == {'user': {'id': '10'}}
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.18
+    assert client.rate_limited == 1
+    assert client.stats()['invalid_requests_10m'] == 1
+
+
+def test_global_429_pauses_every_route():
+    async def scenario():
+        hits = []
+
+        async def member(request):
+            hits.append(('member', time.monotonic()))
+            if len(hits) == 1:
+                return web.json_response({'message': 'You are being rate limited.', 'retry_after': 0.3,
+                                          'global': True}, status=429, headers={'X-RateLimit-Global': 'true'})
+            return web.json_response({'user': {'id': '10'}})
+
+        async def members(request):
+            hits.append(('members', time.monotonic()))
+            return web.json_response([])
+
+        runner, url = await serve([
+            web.get('/guilds/{guild_id}/members/{user_id}', member),
+            web.get('/guilds/{guild_id}/members', members),
+        ])
+        client = DiscordRESTClient('token', api_base=url)
+        try:
+            limited = asyncio.create_task(client.get_member('1', '10'))
+            while not hits:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            # A different route, sent while the global limit is in force
+            other = await client.list_members('1')
+            return client, await limited, other, hits
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    client, limited, other, hits = asyncio.run(scenario())
+    assert limited.status == 200
+    assert other.status == 200
+    first_hit = hits[0][1]
+    other_hit = next(at for name, at in hits if name == 'members')
+    assert other_hit - first_hit >= 0.25
+    assert client._global_reset_at > 0
@@ -0,0 +1,23 @@
+import asyncio
+
+from dm_notifier import RoleNotificationQueue
+
+
+def test_stop_sends_held_notifications_without_waiting_for_the_batch_window():
+    async def scenario():
+        sent = []
+
+        async def send(notification):
+            sent.append(notification)
+
+        queue = RoleNotificationQueue(send, batch_window=60, send_interval=0)
+        queue.start()
+        queue.notify('1', 'osmo1', ['Holder'], [])
+        queue.notify('2', 'osmo2', [], ['Whale'])
+        started = asyncio.get_running_loop().time()
+        await queue.stop(timeout=5)
+        return sent, asyncio.get_running_loop().time() - started
+
+    sent, elapsed = asyncio.run(scenario())
+    assert sorted(notification.user_id for notification in sent) == ['1', '2']
+    assert elapsed < 1
@@ -0,0 +1,75 @@
+import asyncio
+
+import aiohttp
+from aiohttp import web
+
+from lcd_pool import LCDEndpointPool
+
+
+async def serve(routes):
+    app = web.Application()
+    app.router.add_routes(routes)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_malformed_json_fails_over_and_penalises_endpoint():
+    async def scenario():
+        async def truncated(request):
+            return web.Response(text='{"balances": [', content_type='application/json')
+
+        async def healthy(request):
+            return web.json_response({'balances': []})
+
+        bad_runner, bad_url = await serve([web.get('/balance', truncated)])
+        good_runner, good_url = await serve([web.get('/balance', healthy)])
+        try:
+            pool = LCDEndpointPool([bad_url, good_url], hedging=False)
+            async with aiohttp.ClientSession() as session:
+                result = await pool.get(session, '/balance')
+            return pool, result, bad_url, good_url
+        finally:
+            await bad_runner.cleanup()
+            await good_runner.cleanup()
+
+    pool, result, bad_url, good_url = asyncio.run(scenario())
+    assert result.endpoint == good_url
+    assert result.data == {'balances': []}
+    bad = next(endpoint for endpoint in pool.endpoints if endpoint.url == bad_url)
+    assert bad.consecutive_failures == 1
+    assert pool.failovers == 1
+
+
+def test_losing_a_hedge_race_does_not_count_as_success():
+    async def scenario():
+        async def stalled(request):
+            await asyncio.sleep(5)
+            return web.json_response({})
+
+        async def healthy(request):
+            return web.json_response({'ok': True})
+
+        slow_runner, slow_url = await serve([web.get('/balance', stalled)])
+        fast_runner, fast_url = await serve([web.get('/balance', healthy)])
+        try:
+            pool = LCDEndpointPool([slow_url, fast_url], default_hedge_delay=0.05)
+            slow = pool.endpoints[0]
+            slow.consecutive_failures = 2
+            # Make sure the stalled endpoint is tried first
+            pool.endpoints[1].record(1.0, True)
+            async with aiohttp.ClientSession() as session:
+                result = await pool.get(session, '/balance')
+                await asyncio.sleep(0.05)  # let the cancelled request unwind
+            return pool, slow, result, fast_url
+        finally:
+            await slow_runner.cleanup()
+            await fast_runner.cleanup()
+
+    pool, slow, result, fast_url = asyncio.run(scenario())
+    assert result.endpoint == fast_url
+    assert pool.hedges_won == 1
+    assert slow.consecutive_failures == 2
@@ -0,0 +1,24 @@
+import asyncio
+
+from mongo_pool import MongoConnectionManager, WORKLOAD_MONITOR
+
+
+def test_saturation_counts_every_loops_client():
+    manager = MongoConnectionManager('mongodb://localhost:27017/test')
+
+    async def client():
+        return manager.get_client(WORKLOAD_MONITOR)
+
+    # One client per event loop, both reporting to the workload's listener
+    first, second = asyncio.run(client()), asyncio.run(client())
+    listener = manager._listeners[WORKLOAD_MONITOR]
+    for _ in range(listener.max_pool_size):
+        listener.connection_checked_out(None)
+
+    stats = manager.stats()[WORKLOAD_MONITOR]
+    assert stats['clients'] == 2
+    assert stats['saturation'] == 0.5
+
+    manager.release(first)
+    manager.release(second)
+    assert manager.stats()[WORKLOAD_MONITOR]['clients'] == 0
@@ -0,0 +1,31 @@
+from poll_scheduler import PollScheduler, TIER_COLD, TIER_HOT, TIER_WARM
+
+INTERVALS = {TIER_HOT: (30, 60), TIER_WARM: (120, 600), TIER_COLD: (900, 3600)}
+
+
+def make_scheduler():
+    scheduler = PollScheduler(INTERVALS)
+    scheduler.set_thresholds([100.0])
+    return scheduler
+
+
+def test_unseen_wallet_without_balance_is_due():
+    assert make_scheduler().is_due({'walletAddress': 'osmo1'}, now=0)
+
+
+def test_unseen_wallet_near_threshold_is_due_straight_away():
+    scheduler = make_scheduler()
+    assert scheduler.is_due({'walletAddress': 'osmo1', 'lastKnownBalance': 99.0}, now=0)
+    assert scheduler.stats()[TIER_HOT] == 1
+
+
+def test_unseen_dormant_wallet_is_spread_over_its_tier_interval():
+    scheduler = make_scheduler()
+    wallets = [{'walletAddress': f'osmo{i}', 'lastKnownBalance': 1.0} for i in range(50)]
+
+    due_now = [wallet for wallet in wallets if scheduler.is_due(wallet, now=0)]
+
+    assert scheduler.stats()[TIER_COLD] == 50
+    assert not due_now
+    # Every seeded wallet comes due within one cold interval
+    assert all(scheduler.is_due(wallet, now=INTERVALS[TIER_COLD][1]) for wallet in wallets)
@@ -0,0 +1,36 @@
+import role_catalog
+from role_catalog import EligibilityIndex, RoleSnapshot
+
+
+ROLES = [
+    {'_id': '65a000000000000000000001', 'type': 'holder', 'discordRoleId': 'holder'},
+    {'_id': '65a000000000000000000004', 'type': 'amount', 'discordRoleId': 'whale-late', 'amountThreshold': 1000},
+    {'_id': '65a000000000000000000002', 'type': 'amount', 'discordRoleId': 'fish', 'amountThreshold': 10},
+    {'_id': '65a000000000000000000003', 'type': 'amount', 'discordRoleId': 'whale-early', 'amountThreshold': 1000},
+]
+
+
+def test_highest_role_per_balance():
+    eligibility = RoleSnapshot.build(1, ROLES).eligibility
+    assert eligibility.role_ids_for_balance(0) == frozenset()
+    assert eligibility.role_ids_for_balance(5) == {'holder'}
+    assert eligibility.role_ids_for_balance(10) == {'holder', 'fish'}
+    assert [role['discordRoleId'] for role in eligibility.roles_for_balance(50)] == ['holder', 'fish']
+
+
+def test_tied_thresholds_pick_earliest_created_role():
+    eligibility = RoleSnapshot.build(1, ROLES).eligibility
+    assert eligibility.highest_amount_role(5000)['discordRoleId'] == 'whale-early'
+    assert eligibility.role_ids_for_balance(1000) == {'holder', 'whale-early'}
+    assert eligibility.role_ids_for_balances([1000, 5000]) == [{'holder', 'whale-early'}] * 2
+
+
+def test_batch_lookup_matches_without_numpy(monkeypatch):
+    balances = [-1, 0, 5, 10, 999.9, 1000, 10 ** 9]
+    snapshot = RoleSnapshot.build(1, ROLES)
+    expected = [snapshot.eligibility.role_ids_for_balance(balance) for balance in balances]
+    assert snapshot.eligibility.role_ids_for_balances(balances) == expected
+
+    monkeypatch.setattr(role_catalog, 'np', None)
+    fallback = EligibilityIndex(snapshot.holder_roles, snapshot.amount_roles)
+    assert fallback.role_ids_for_balances(balances) == expected
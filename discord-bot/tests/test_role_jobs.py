@@ -0,0 +1,20 @@
+import asyncio
+
+from role_jobs import JOB_SUCCEEDED, RoleJobQueue
+
+
+def test_stop_finishes_queued_jobs():
+    async def scenario():
+        async def handler(payload):
+            await asyncio.sleep(0.01)
+            return {'payload': payload}
+
+        queue = RoleJobQueue(handler, workers=1)
+        queue.start()
+        jobs = [queue.submit(i) for i in range(3)]
+        await queue.stop(timeout=5)
+        return jobs
+
+    jobs = asyncio.run(scenario())
+    assert [job.status for job in jobs] == [JOB_SUCCEEDED] * 3
+    assert jobs[2].result == {'payload': 2}
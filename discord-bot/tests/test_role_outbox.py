@@ -0,0 +1,83 @@
+import asyncio
+
+from conftest import AsyncDatabase
+from balance_monitor import BalanceMonitor
+from discord_rest import DiscordResponse
+from role_catalog import RoleCatalog, RoleSnapshot
+from role_outbox import RoleSyncOutbox, STATUS_DEAD, STATUS_PENDING
+
+
+class FakeDiscord:
+    def __init__(self, edit_status):
+        self.edit_status = edit_status
+
+    async def get_member(self, guild_id, user_id):
+        return DiscordResponse(200, {'roles': []})
+
+    async def edit_member(self, guild_id, user_id, payload, reason=None):
+        return DiscordResponse(self.edit_status, {'message': 'nope'})
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.role_catalog = RoleCatalog(None)
+        self.role_catalog._snapshot = RoleSnapshot.build(1, [
+            {'_id': 'holder', 'type': 'holder', 'discordRoleId': '111'}
+        ])
+
+
+def make_monitor(edit_status):
+    monitor = BalanceMonitor.__new__(BalanceMonitor)
+    monitor.guild_id = '1'
+    monitor.database = FakeDatabase()
+    monitor.discord = FakeDiscord(edit_status)
+    monitor.role_outbox = RoleSyncOutbox(AsyncDatabase())
+    return monitor
+
+
+async def sync_once(edit_status):
+    monitor = make_monitor(edit_status)
+    outbox = monitor.role_outbox
+    await outbox.enqueue([{'discordId': '42', 'walletAddress': 'osmo1', 'currentBalance': 10.0}])
+    job = await outbox.claim()
+    await monitor._process_outbox_job(job)
+    return await outbox.collection.find_one({'_id': '42'})
+
+
+def test_forbidden_job_is_parked_dead():
+    job = asyncio.run(sync_once(403))
+    assert job['status'] == STATUS_DEAD
+    assert job['attempts'] == 1
+
+
+def test_unavailable_job_stays_pending_with_backoff():
+    job = asyncio.run(sync_once(503))
+    assert job['status'] == STATUS_PENDING
+    assert job['attempts'] == 1
+    assert job['leaseOwner'] is None
+    assert job['availableAt'] > job['updatedAt']
+
+
+def test_balances_are_not_saved_when_enqueue_fails():
+    async def scenario():
+        monitor = make_monitor(200)
+        monitor.shards = None
+        saved = []
+
+        async def batch_check_balances(wallets):
+            return [{'discordId': '42', 'walletAddress': 'osmo1', 'currentBalance': 10.0}]
+
+        async def enqueue(balance_updates):
+            raise ConnectionError('outbox unavailable')
+
+        async def save_balance_history(balance_updates):
+            saved.extend(balance_updates)
+
+        monitor.batch_check_balances = batch_check_balances
+        monitor.role_outbox.enqueue = enqueue
+        monitor.save_balance_history = save_balance_history
+        return await monitor.process_wallets([]), saved
+
+    processed, saved = asyncio.run(scenario())
+    assert processed == 0
+    assert saved == []
@@ -0,0 +1,88 @@
+import asyncio
+import base64
+
+import aiohttp
+from aiohttp import web
+
+from rpc_balance import (
+    BALANCE_PATH, TendermintRPCBalanceClient, _encode_bytes_field, _iter_fields, decode_all_balances_response,
+    decode_balance_response, encode_all_balances_request, encode_balance_request
+)
+
+DENOM = 'uosmo'
+
+
+def encode_coin_response(denom, amount):
+    """QueryBalanceResponse{Coin{denom, amount}}"""
+    coin = _encode_bytes_field(1, denom.encode()) + _encode_bytes_field(2, amount.encode())
+    return _encode_bytes_field(1, coin)
+
+
+def decode_request(data_hex):
+    fields = {number: value for number, _, value in _iter_fields(bytes.fromhex(data_hex))}
+    return fields[1].decode(), fields[2].decode()
+
+
+def test_balance_request_round_trip():
+    assert decode_request(encode_balance_request('osmo1abc', DENOM).hex()) == ('osmo1abc', DENOM)
+    assert decode_balance_response(encode_coin_response(DENOM, '12345')) == (DENOM, '12345')
+    assert decode_balance_response(b'') is None
+
+
+def test_all_balances_pagination_key():
+    request = {number: value for number, _, value in _iter_fields(encode_all_balances_request('osmo1', b'next'))}
+    page = {number: value for number, _, value in _iter_fields(request[2])}
+    assert page[1] == b'next' and page[3] == 200
+
+    response = (_encode_bytes_field(1, _encode_bytes_field(1, b'uatom') + _encode_bytes_field(2, b'7'))
+                + _encode_bytes_field(2, _encode_bytes_field(1, b'key2')))
+    assert decode_all_balances_response(response) == ([('uatom', '7')], b'key2')
+
+
+def test_batch_matches_responses_by_id():
+    holdings = {'osmo1rich': '5000000', 'osmo1empty': None}
+    received = []
+
+    async def rpc(request):
+        calls = await request.json()
+        received.append(calls)
+        results = []
+        for call in calls:
+            assert call['method'] == 'abci_query' and call['params']['path'] == BALANCE_PATH
+            address, denom = decode_request(call['params']['data'])
+            if address == 'osmo1broken':
+                results.append({'jsonrpc': '2.0', 'id': call['id'], 'error': {'code': -32603, 'message': 'boom'}})
+                continue
+            amount = holdings[address]
+            value = base64.b64encode(encode_coin_response(denom, amount)).decode() if amount else None
+            results.append({'jsonrpc': '2.0', 'id': call['id'],
+                            'result': {'response': {'code': 0, 'value': value}}})
+        # Answer in reverse so matching must go by id, not position
+        return web.json_response(list(reversed(results)))
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post('/', rpc)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            client = TendermintRPCBalanceClient(f"http://127.0.0.1:{port}")
+            async with aiohttp.ClientSession() as session:
+                return await client.query_balances(
+                    session, ['osmo1rich', 'osmo1broken', 'osmo1empty', 'osmo1rich'], denoms=[DENOM]
+                )
+        finally:
+            await runner.cleanup()
+
+    response = asyncio.run(scenario())
+    assert response.status == 200
+    assert response.balances == {
+        'osmo1rich': [(DENOM, '5000000')],
+        'osmo1broken': None,
+        'osmo1empty': [],
+    }
+    # The duplicate address was only queried once
+    assert len(received[0]) == 3
@@ -8,8 +8,10 @@ from dotenv import load_dotenv
 import logging
 import uvicorn
 from typing import Optional, Annotated
-from pymongo import MongoClient
-from motor.motor_asyncio import AsyncIOMotorClient
+
+from bot_readiness import BotReadiness, require_ready, health_router
+from database import db
+from mongo_pool import mongo_clients
 
 # Load environment variables
 load_dotenv()
@@ -22,8 +24,6 @@ app = FastAPI()
 
 # Discord bot instance for role management
 bot_instance = None
-# MongoDB client
-mongo_client = None
 
 class RoleAssignmentRequest(BaseModel):
     wallet_address: str
@@ -47,6 +47,9 @@ class DiscordBot(commands.Bot):
 
 # Initialize bot
 discord_bot = DiscordBot()
+bot_readiness = BotReadiness.from_env(discord_bot)
+require_bot_ready = require_ready(bot_readiness)
+app.include_router(health_router(bot_readiness))
 
 # API Key authentication
 async def verify_api_key(x_api_key: Annotated[str, Header()] = None):
@@ -67,16 +70,15 @@ async def verify_api_key(x_api_key: Annotated[str, Header()] = None):
 @app.on_event("startup")
 async def startup_event():
     """Start the Discord bot and MongoDB connection when FastAPI starts"""
-    global bot_instance, mongo_client
+    global bot_instance
     bot_instance = discord_bot
     
-    # Initialize MongoDB connection
-    mongodb_uri = os.getenv('MONGODB_URI')
-    if mongodb_uri:
-        mongo_client = AsyncIOMotorClient(mongodb_uri)
+    # Initialize MongoDB connection through the shared async data-access layer
+    try:
+        await db.connect()
         logger.info("Connected to MongoDB")
-    else:
-        logger.warning("MONGODB_URI not found, user mapping will not work")
+    except Exception as e:
+        logger.warning(f"MongoDB connection failed, user mapping will not work: {e}")
     
     token = os.getenv('DISCORD_BOT_TOKEN')
     if not token:
@@ -84,13 +86,14 @@ async def startup_event():
         raise HTTPException(status_code=500, detail="Discord bot token not configured")
     
     # Start bot in background
-    asyncio.create_task(discord_bot.start(token))
+    bot_readiness.start(token)
     
-    # Wait for bot to be ready
-    await asyncio.sleep(3)
+    # Wait for the gateway ready and member chunking; requests arriving later are held until then
+    await bot_readiness.wait_for_startup()
 
 @app.post("/assign-test-role")
-async def assign_test_role(request: RoleAssignmentRequest, _: bool = Depends(verify_api_key)):
+async def assign_test_role(request: RoleAssignmentRequest, _: bool = Depends(verify_api_key),
+                           __: bool = Depends(require_bot_ready)):
     """Assign a test role to a user and remove it after 30 seconds"""
     try:
         if not bot_instance or not bot_instance.is_ready():
@@ -145,20 +148,12 @@ async def get_discord_user_by_wallet(wallet_address: str) -> Optional[int]:
     """
     Get Discord user ID by wallet address from MongoDB
     """
-    if not mongo_client:
+    if not db.client:
         logger.error("MongoDB client not initialized")
         return None
     
     try:
-        db = mongo_client[os.getenv('MONGODB_DB_NAME', 'cosmos-verifier')]
-        users_collection = db['users']
-        
-        user = await users_collection.find_one({"walletAddress": wallet_address})
-        
-        if user and 'discordId' in user:
-            return int(user['discordId'])
-        
-        return None
+        return await db.get_discord_id_by_wallet(wallet_address)
         
     except Exception as e:
         logger.error(f"Error querying database for wallet {wallet_address}: {e}")
@@ -169,8 +164,11 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "bot_ready": bot_instance.is_ready() if bot_instance else False,
-        "mongodb_connected": mongo_client is not None
+        "live": bot_readiness.live,
+        "bot_ready": bot_readiness.ready,
+        "bot_readiness": bot_readiness.stats(),
+        "mongodb_connected": db.client is not None,
+        "mongodb_pools": mongo_clients.stats()
     }
 
 if __name__ == "__main__":